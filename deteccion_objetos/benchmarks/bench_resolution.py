@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Benchmark de latencia según el tamaño de la imagen
+Mide el pipeline completo (rostros, cascos, teléfonos, mascarillas) a
+resolución nativa y reduciendo primero a DETECTION_MAX_SIZE.
+
+Uso: python benchmarks/bench_resolution.py [ruta_imagen]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from detection.pipeline import DETECTION_MAX_SIZE, DetectionPipeline
+from detection.resources import face_cascade
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGE = os.path.join(BASE_DIR, 'media', 'detections', 'original_1761601233.jpg')
+SIZES = [(640, 480), (1280, 960), (1920, 1440), (4000, 3000)]
+
+
+def time_pipeline(pipeline, image, repeat):
+    best = None
+    detections = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detections = pipeline.run(image)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(detections)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_IMAGE
+    source = cv2.imread(path)
+    if source is None:
+        print(f"No se pudo leer {path}")
+        return
+
+    print(f"Imagen base: {path}")
+    print(f"{'tamaño':>11} | {'nativa':>10} {'obj':>4} | {f'max {DETECTION_MAX_SIZE}px':>12} {'obj':>4}")
+    print("-" * 52)
+    with face_cascade() as cascade:
+        native = DetectionPipeline(cascade, max_size=0)
+        reduced = DetectionPipeline(cascade, max_size=DETECTION_MAX_SIZE)
+        for width, height in SIZES:
+            image = cv2.resize(source, (width, height), interpolation=cv2.INTER_CUBIC)
+            repeat = 3 if width * height <= 2000000 else 1
+            native_time, native_count = time_pipeline(native, image, repeat)
+            reduced_time, reduced_count = time_pipeline(reduced, image, repeat)
+            print(f"{width:>5}x{height:<5} | {native_time * 1000:8.1f}ms {native_count:>4} | "
+                  f"{reduced_time * 1000:10.1f}ms {reduced_count:>4}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+"""
+Suite de benchmarks reproducible
+Mide sin servidor ni cámara:
+  - cada detector del pipeline y las representaciones que comparten (gris,
+    HSV, bordes), sobre imágenes sintéticas y de media/detections a varias
+    resoluciones, y el pipeline completo
+  - la vista upload_image completa con el cliente de pruebas de Django
+    (imagen nueva y repetida), sobre una base de datos de prueba
+  - la generación del stream MJPEG a partir de un video grabado que reemplaza
+    a la cámara, con uno y varios espectadores
+Las imágenes y el video se generan con semilla fija y OpenCV usa un solo hilo
+(--threads), para que dos corridas en la misma máquina sean comparables.
+
+Uso:
+  python benchmarks/bench_suite.py [--quick] [--only detector,upload,mjpeg] [--json salida.json]
+  python benchmarks/bench_suite.py --compare base.json [--threshold 0.1]
+
+Con --compare se muestra la diferencia con una corrida anterior y se sale con
+código 1 si algún resultado empeoró más que el umbral.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'object_detection_app.settings')
+
+import django
+django.setup()
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment
+
+from detection.broadcast import FrameBroadcaster
+from detection.camera import VideoCamera
+from detection.encoding import encode_jpeg
+from detection.persistence import get_writer
+from detection.pipeline import REPRESENTATIONS, DetectionPipeline, FrameContext
+from detection.resources import face_cascade
+from detection.views import gen
+
+FIXTURE_IMAGE = os.path.join(BASE_DIR, 'media', 'detections', 'original_1761601233.jpg')
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+QUICK_RESOLUTIONS = [(640, 480), (1920, 1080)]
+GROUPS = ('detector', 'upload', 'mjpeg')
+# Video que reemplaza a la cámara
+VIDEO_SIZE = (640, 480)
+VIDEO_FRAMES = 90
+VIDEO_FPS = 30
+STREAM_QUALITY = 80
+STREAM_VIEWERS = (1, 10)
+SEED = 0
+# Diferencias de latencia menores que esto (ms) no cuentan como regresión: son ruido
+MIN_DELTA_MS = 0.5
+
+
+# ---------------------------------------------
+# Datos de prueba
+# ---------------------------------------------
+def synthetic_image(width, height, seed=SEED, shift=0):
+    """Fondo con ruido, un casco amarillo y rectángulos oscuros tipo teléfono"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    unit = max(width, height) / 64
+    cx = int(width * 0.3 + shift * unit) % width
+    cv2.ellipse(image, (cx, int(height * 0.25)), (int(unit * 4), int(unit * 3)), 0, 0, 360, (0, 200, 255), -1)
+    for i in range(3):
+        x = int(width * (0.55 + 0.12 * i))
+        y = int(height * 0.5)
+        cv2.rectangle(image, (x, y), (x + int(unit * 1.5), y + int(unit * 3)), (20, 20, 20), -1)
+    return image
+
+
+def benchmark_images(resolutions):
+    """[(nombre, imagen)]: sintéticas y, si existe, la imagen de media/detections"""
+    fixture = cv2.imread(FIXTURE_IMAGE)
+    images = []
+    for width, height in resolutions:
+        images.append((f'synthetic-{width}x{height}', synthetic_image(width, height)))
+        if fixture is not None:
+            resized = cv2.resize(fixture, (width, height), interpolation=cv2.INTER_AREA)
+            images.append((f'fixture-{width}x{height}', resized))
+    return images
+
+
+def make_video(path, frames=VIDEO_FRAMES):
+    """Video MJPG con un casco que se desplaza, para usarlo como cámara"""
+    width, height = VIDEO_SIZE
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), VIDEO_FPS, (width, height))
+    for i in range(frames):
+        writer.write(synthetic_image(width, height, seed=SEED, shift=i % 32))
+    writer.release()
+    return path
+
+
+# ---------------------------------------------
+# Medición
+# ---------------------------------------------
+def measure(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def timing(name, samples, **params):
+    """Resultado de latencia en ms; el valor comparable es la mediana"""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        'name': name,
+        'params': params,
+        'unit': 'ms',
+        'higher_is_better': False,
+        'value': round(statistics.median(ms), 4),
+        'min': round(ms[0], 4),
+        'mean': round(statistics.fmean(ms), 4),
+        'p95': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        'repeat': len(ms),
+    }
+
+
+def throughput(name, value, unit, **params):
+    return {
+        'name': name,
+        'params': params,
+        'unit': unit,
+        'higher_is_better': True,
+        'value': round(value, 4),
+    }
+
+
+# ---------------------------------------------
+# Benchmarks
+# ---------------------------------------------
+def bench_detectors(resolutions, repeat):
+    """Representaciones, cada detector y el pipeline completo, como los usa el pipeline"""
+    results = []
+    max_size = getattr(settings, 'DETECTION_MAX_SIZE', 0)
+    with face_cascade() as cascade:
+        pipeline = DetectionPipeline(cascade, max_size=max_size)
+        for image_name, image in benchmark_images(resolutions):
+            scale = pipeline.working_scale(image)
+            work = image
+            if scale != 1.0:
+                work = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            params = {'image': image_name, 'working_size': f'{work.shape[1]}x{work.shape[0]}'}
+
+            # Contexto con las representaciones listas y los resultados previos
+            # (las mascarillas necesitan los rostros), como dentro de run()
+            ctx = FrameContext(work)
+            for name in pipeline.representations:
+                ctx.get(name)
+            for name in pipeline.representations:
+                # Cada representación se recalcula sola; las que usa (p. ej. gris para bordes) ya están
+                samples = measure(lambda: REPRESENTATIONS[name](ctx), repeat)
+                results.append(timing(f'representation.{name}[{image_name}]', samples, **params))
+
+            for detector in pipeline.detectors:
+                samples = measure(lambda: detector.detect(ctx), repeat)
+                ctx.results[detector.label] = detector.detect(ctx)
+                results.append(timing(f'detector.{detector.label}[{image_name}]', samples,
+                                      found=len(ctx.results[detector.label]), **params))
+
+            samples = measure(lambda: pipeline.run(image), repeat)
+            results.append(timing(f'pipeline.run[{image_name}]', samples,
+                                  found=len(pipeline.run(image)), **params))
+    return results
+
+
+def bench_upload(resolutions, repeat):
+    """POST /upload/ completo: decodificación, detección, JPEG, archivos y base de datos"""
+    results = []
+    client = Client()
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        for width, height in resolutions:
+            # Imágenes distintas en cada iteración para no acertar en la caché por hash
+            payloads = []
+            for i in range(repeat + 1):
+                ok, buffer = cv2.imencode('.jpg', synthetic_image(width, height, seed=SEED + i + 1))
+                payloads.append(buffer.tobytes())
+
+            def post(data):
+                response = client.post('/upload/', {'image': SimpleUploadedFile('bench.jpg', data, 'image/jpeg')})
+                if response.status_code != 200:
+                    raise RuntimeError(f"/upload/ respondió {response.status_code}: {response.content[:200]}")
+
+            pending = iter(payloads)
+            samples = measure(lambda: post(next(pending)), repeat)
+            size = f'{width}x{height}'
+            results.append(timing(f'upload.new[{size}]', samples, image=size,
+                                  bytes=len(payloads[0])))
+
+            samples = measure(lambda: post(payloads[0]), repeat)
+            results.append(timing(f'upload.cached[{size}]', samples, image=size))
+    return results
+
+
+def consume_stream(broadcaster, frames, counts, index):
+    stream = gen(broadcaster, STREAM_QUALITY)
+    try:
+        for part in stream:
+            counts[index][0] += 1
+            counts[index][1] += len(part)
+            if counts[index][0] >= frames:
+                break
+    finally:
+        stream.close()
+
+
+def bench_mjpeg(frames, repeat):
+    """Codificación JPEG y stream MJPEG desde el video de prueba"""
+    results = []
+    width, height = VIDEO_SIZE
+    image = synthetic_image(width, height)
+    samples = measure(lambda: encode_jpeg(image, STREAM_QUALITY), repeat * 5)
+    results.append(timing(f'mjpeg.encode[{width}x{height},q{STREAM_QUALITY}]', samples))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_video(os.path.join(tmp, 'camera.avi'))
+        for viewers in STREAM_VIEWERS:
+            # Sin límite de FPS: se mide cuántos frames anotados y codificados se producen
+            camera = VideoCamera(source=path, width=0, height=0, max_fps=1000, worker_process=False)
+            broadcaster = FrameBroadcaster(camera, idle_timeout=60)
+            try:
+                # Calentar: primer frame con cascada cargada y conexión abierta
+                consume_stream(broadcaster, 5, [[0, 0]], 0)
+                counts = [[0, 0] for _ in range(viewers)]
+                threads = [
+                    threading.Thread(target=consume_stream, args=(broadcaster, frames, counts, i))
+                    for i in range(viewers)
+                ]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+            finally:
+                broadcaster.closed = True
+                broadcaster.stop()
+                camera.release()
+            delivered = sum(c[0] for c in counts)
+            params = {'viewers': viewers, 'frames': frames, 'quality': STREAM_QUALITY,
+                      'bytes_per_frame': sum(c[1] for c in counts) // max(delivered, 1)}
+            results.append(throughput(f'mjpeg.stream_fps[viewers={viewers}]', frames / elapsed, 'fps', **params))
+            results.append(throughput(f'mjpeg.delivered_fps[viewers={viewers}]', delivered / elapsed, 'fps', **params))
+    return results
+
+
+# ---------------------------------------------
+# Resultados
+# ---------------------------------------------
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args):
+    return {
+        'commit': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': args.threads,
+        'quick': args.quick,
+        'detection_max_size': getattr(settings, 'DETECTION_MAX_SIZE', 0),
+    }
+
+
+def print_results(results):
+    print(f"{'benchmark':<58} {'valor':>11} {'unidad':<6} {'p95':>10}")
+    print("-" * 88)
+    for result in results:
+        p95 = f"{result['p95']:10.2f}" if 'p95' in result else ''
+        print(f"{result['name']:<58} {result['value']:11.2f} {result['unit']:<6} {p95}")
+
+
+def compare(results, baseline, threshold):
+    """Imprimir el cambio respecto de la corrida base; devuelve la cantidad de regresiones"""
+    previous = {result['name']: result for result in baseline['results']}
+    print(f"\nComparación con {baseline['environment'].get('commit')} "
+          f"(umbral {threshold:.0%}; positivo = peor)")
+    print("-" * 88)
+    regressions = 0
+    for result in results:
+        base = previous.get(result['name'])
+        if base is None or not base['value'] or not result['value']:
+            continue
+        if result['higher_is_better']:
+            change = base['value'] / result['value'] - 1
+        else:
+            change = result['value'] / base['value'] - 1
+        flag = ''
+        noise = result['unit'] == 'ms' and abs(result['value'] - base['value']) < MIN_DELTA_MS
+        if change > threshold and not noise:
+            flag = '  REGRESIÓN'
+            regressions += 1
+        print(f"{result['name']:<58} {base['value']:11.2f} -> {result['value']:11.2f} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suite de benchmarks de detección')
+    parser.add_argument('--quick', action='store_true', help='Menos resoluciones y repeticiones')
+    parser.add_argument('--only', help='Grupos a ejecutar, separados por comas: ' + ', '.join(GROUPS))
+    parser.add_argument('--repeat', type=int, help='Repeticiones por medición')
+    parser.add_argument('--threads', type=int, default=1, help='Hilos de OpenCV (por defecto 1)')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--compare', help='Resultados JSON de una corrida anterior')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Empeoramiento tolerado (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    groups = args.only.split(',') if args.only else GROUPS
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"Grupos desconocidos: {', '.join(sorted(unknown))}")
+    resolutions = QUICK_RESOLUTIONS if args.quick else RESOLUTIONS
+    repeat = args.repeat or (5 if args.quick else 20)
+    frames = 30 if args.quick else 120
+    cv2.setNumThreads(args.threads)
+
+    # Base de datos de prueba: las subidas y el stream guardan detecciones
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    results = []
+    try:
+        if 'detector' in groups:
+            results += bench_detectors(resolutions, repeat)
+        if 'upload' in groups:
+            results += bench_upload(resolutions, repeat)
+        if 'mjpeg' in groups:
+            results += bench_mjpeg(frames, repeat)
+    finally:
+        # Lo que la cámara dejó en cola se escribe antes de borrar la base
+        get_writer().flush()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print_results(results)
+    report = {'environment': environment(args), 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Benchmark de memoria de la subida de imágenes
+Compara el pico de memoria del camino anterior (read() + seek(0) + read()
+otra vez) con la decodificación directa desde el buffer de la subida,
+para una imagen JPEG de ~20 MB.
+
+Uso: python benchmarks/bench_upload_memory.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'object_detection_app.settings')
+
+import django
+django.setup()
+
+import cv2
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+
+from detection.uploads import decode_upload
+
+
+def make_jpeg(width=3800, height=2800):
+    """JPEG de ruido a calidad 100 (~20 MB)"""
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    return buffer.tobytes()
+
+
+def make_upload(data, spooled):
+    """Archivo subido como lo entrega Django (en memoria o en un temporal)"""
+    if spooled:
+        upload = TemporaryUploadedFile('image.jpg', 'image/jpeg', len(data), None)
+        upload.write(data)
+        upload.flush()
+        upload.seek(0)
+        return upload
+    return InMemoryUploadedFile(io.BytesIO(data), 'image', 'image.jpg', 'image/jpeg', len(data), None)
+
+
+def legacy_path(upload, storage):
+    """Camino anterior de upload_image"""
+    image_data = upload.read()
+    upload.seek(0)
+    nparr = np.frombuffer(image_data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    storage.save('original.jpg', ContentFile(upload.read()))
+    return image
+
+
+def zero_copy_path(upload, storage):
+    """Camino actual: decodificar desde el buffer y guardar el archivo subido"""
+    image = decode_upload(upload)
+    upload.seek(0)
+    storage.save('original.jpg', upload)
+    return image
+
+
+def measure(func, data, spooled):
+    storage = FileSystemStorage(location=tempfile.mkdtemp())
+    upload = make_upload(data, spooled)
+    tracemalloc.start()
+    start = time.perf_counter()
+    image = func(upload, storage)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    upload.close()
+    decoded = image.nbytes
+    del image
+    return peak, decoded, elapsed
+
+
+def main():
+    data = make_jpeg()
+    print(f"Imagen de prueba: {len(data) / 1e6:.1f} MB")
+    print("=" * 64)
+    for spooled in (True, False):
+        kind = 'temporal en disco' if spooled else 'en memoria'
+        legacy_peak, decoded, legacy_time = measure(legacy_path, data, spooled)
+        new_peak, _, new_time = measure(zero_copy_path, data, spooled)
+        print(f"Subida {kind} (imagen decodificada: {decoded / 1e6:.1f} MB)")
+        print(f"  anterior:  pico {legacy_peak / 1e6:7.1f} MB  {legacy_time * 1000:7.1f} ms")
+        print(f"  sin copia: pico {new_peak / 1e6:7.1f} MB  {new_time * 1000:7.1f} ms")
+        print(f"  ahorro:         {(legacy_peak - new_peak) / 1e6:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,15 +12,15 @@ from django.conf import settings
 import json
 from django.utils import timezone
 from datetime import timedelta
-from collections import Counter
 
-# 🚨 IMPORTANTE: Reemplaza 'your_project_name' con el nombre de tu proyecto Django
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'your_project_name.settings') 
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'object_detection_app.settings')
 django.setup()
 
 # Asumimos que el modelo de resultados de detección se llama 'DetectionResult'
 # Asegúrate de que esta importación coincida con la estructura de tu app
-from detection.models import DetectionResult 
+from detection.analytics import risk_report
+from detection.models import DetectionResult, build_detected_objects
+from detection.rollups import save_detected_objects
 
 
 # ---------------------------------------------
@@ -72,6 +72,10 @@ def generate_audit_records():
         record.created_at = timezone.now() - timedelta(minutes=i*30) 
         
         record.save()
+        # Una fila por etiqueta, con el riesgo normalizado como confianza
+        save_detected_objects(build_detected_objects(
+            record, [(label, None, None) for label in event['detected_labels']],
+            default_confidence=event['risk_level'] / 5.0))
         print(f"✅ Registro de Auditoría #{record.id} (Riesgo {event['risk_level']}): {event['audit_summary']}")
     
     print(f"\n🎉 Se han generado {len(security_events)} registros de auditoría simulados.")
@@ -85,40 +89,33 @@ def show_risk_analysis():
     print("\n📈 ANÁLISIS DE RIESGO DETECTADO")
     print("="*50)
     
-    total_records = DetectionResult.objects.count()
+    # Todo el análisis se agrega en la base de datos
+    report = risk_report()
+    total_records = report['total_records']
     print(f"Total de registros de auditoría: {total_records}")
     
     if total_records == 0:
         print("No hay datos para analizar. Genera registros (Opción 1).")
         return
 
-    # Contar la frecuencia de cada etiqueta detectada
-    all_labels = []
-    for record in DetectionResult.objects.all():
-        if record.objects_detected:
-            try:
-                labels = json.loads(record.objects_detected)
-                all_labels.extend(labels)
-            except:
-                continue
-
-    label_counts = Counter(all_labels)
-    
     print("\nFrecuencia de Etiquetas de Riesgo/Seguridad:")
-    if label_counts:
-        for label, count in label_counts.most_common():
+    if report['labels']:
+        for label, count, _ in report['labels']:
             print(f"  - {label.capitalize()}: {count} veces")
     else:
-        print("No se pudieron parsear etiquetas de objetos.")
+        print("No hay objetos detectados registrados.")
 
     # Calcular el riesgo promedio
-    try:
-        total_risk_sum = sum(json.loads(r.confidence_scores)[0] for r in DetectionResult.objects.all() if r.confidence_scores)
-        average_risk = (total_risk_sum / total_records) * 5 # Desnormalizar a escala 1-5
+    if report['average_confidence'] is not None:
+        average_risk = report['average_confidence'] * 5 # Desnormalizar a escala 1-5
         print(f"\nNivel de Riesgo Promedio (Escala 1-5): {average_risk:.2f}")
-    except:
+    else:
         print("\nAdvertencia: No se pudo calcular el riesgo promedio.")
 
+    print("\nDetecciones por hora (últimas 24 horas):")
+    for hour, count in report['by_hour']:
+        print(f"  - {hour:%Y-%m-%d %H:00}: {count}")
+
 
 def remove_all_records():
     """Elimina todos los registros de la base de datos."""
@@ -1,9 +1,17 @@
 from django.contrib import admin
-from .models import DetectionResult
+from .models import DetectedObject, DetectionResult, DetectionRollup
+
+class DetectedObjectInline(admin.TabularInline):
+    model = DetectedObject
+    fields = ('label', 'confidence', 'x', 'y', 'width', 'height')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
 
 @admin.register(DetectionResult)
 class DetectionResultAdmin(admin.ModelAdmin):
-    list_display = ('id', 'detection_count', 'created_at', 'get_objects_preview')
+    inlines = [DetectedObjectInline]
+    list_display = ('id', 'detection_count', 'frame_count', 'duration', 'created_at', 'get_objects_preview')
     list_filter = ('created_at', 'detection_count')
     search_fields = ('objects_detected',)
     readonly_fields = ('created_at',)
@@ -22,7 +30,7 @@ class DetectionResultAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Detection Information', {
-            'fields': ('detection_count', 'objects_detected', 'confidence_scores')
+            'fields': ('detection_count', 'objects_detected', 'confidence_scores', 'frame_count', 'duration')
         }),
         ('Images', {
             'fields': ('image', 'processed_image')
@@ -32,3 +40,23 @@ class DetectionResultAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+@admin.register(DetectedObject)
+class DetectedObjectAdmin(admin.ModelAdmin):
+    list_display = ('id', 'label', 'confidence', 'detection', 'created_at')
+    list_filter = ('label',)
+    raw_id_fields = ('detection',)
+    date_hierarchy = 'created_at'
+
+@admin.register(DetectionRollup)
+class DetectionRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket', 'period', 'label', 'count', 'avg_confidence')
+    list_filter = ('period', 'label')
+    date_hierarchy = 'bucket'
+    
+    # Los resúmenes se mantienen solos al guardar detecciones
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
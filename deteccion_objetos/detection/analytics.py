@@ -0,0 +1,79 @@
+from datetime import timedelta
+from django.db.models import Avg, Count
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import DetectedObject, DetectionResult
+
+# Agregaciones para reportes: todo se calcula en la base de datos,
+# sin cargar ni parsear los registros en Python
+
+BUCKETS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+# Ventana por defecto de la serie por hora del reporte; acotarla permite usar
+# el índice de created_at en vez de truncar la fecha de todas las filas
+REPORT_WINDOW = timedelta(hours=24)
+
+
+def _objects(since=None, until=None, label=None):
+    queryset = DetectedObject.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    if label is not None:
+        queryset = queryset.filter(label=label)
+    return queryset
+
+
+def _results(since=None, until=None):
+    queryset = DetectionResult.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset
+
+
+def label_frequencies(since=None, until=None):
+    """[(etiqueta, veces, confianza promedio)] de la más a la menos frecuente"""
+    return list(
+        _objects(since, until)
+        .order_by()
+        .values_list('label')
+        .annotate(count=Count('id'), avg_confidence=Avg('confidence'))
+        .order_by('-count', 'label')
+    )
+
+
+def average_confidence(since=None, until=None):
+    """Promedio por registro de la confianza de sus objetos (None si no hay datos)"""
+    # Primero el promedio de cada registro y luego el de todos, en una sola consulta
+    per_result = _results(since, until).annotate(result_confidence=Avg('detected_objects__confidence'))
+    return per_result.aggregate(value=Avg('result_confidence'))['value']
+
+
+def counts_by_bucket(bucket='hour', since=None, until=None, label=None):
+    """[(inicio del intervalo, objetos detectados)] ordenado por fecha"""
+    trunc = BUCKETS[bucket]
+    return list(
+        _objects(since, until, label)
+        .order_by()
+        .annotate(bucket=trunc('created_at'))
+        .values_list('bucket')
+        .annotate(count=Count('id'))
+        .order_by('bucket')
+    )
+
+
+def risk_report(since=None, until=None):
+    """Resumen completo para el panel de auditoría"""
+    window_start = since if since is not None else timezone.now() - REPORT_WINDOW
+    return {
+        'total_records': _results(since, until).count(),
+        'total_objects': _objects(since, until).count(),
+        'labels': label_frequencies(since, until),
+        'average_confidence': average_confidence(since, until),
+        'by_hour': counts_by_bucket('hour', window_start, until),
+    }
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class DetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'detection'
+
+    def ready(self):
+        # Cargar los clasificadores antes de la primera petición
+        from .resources import warm_up
+        warm_up()
+        # Conectar las señales que descuentan los resúmenes al borrar
+        from . import rollups  # noqa: F401
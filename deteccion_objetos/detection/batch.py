@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .pipeline import DETECTION_MAX_SIZE, DetectionPipeline
+from .resources import OPENCV_AVAILABLE, cv2, face_cascade, np
+
+# Máximo de imágenes aceptadas en una sola petición
+MAX_BATCH_FILES = 500
+# Bytes máximos de cada imagen subida (sola, en un lote o descomprimida de un zip)
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+# Bytes máximos de todas las imágenes de un lote, ya descomprimidas
+MAX_BATCH_SIZE = 200 * 1024 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+
+# Imágenes que un proceso del pool analiza juntas (la red dnn en una pasada)
+MAX_GROUP_SIZE = 8
+
+# Este módulo no importa Django: los procesos del pool lo cargan por separado
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Un hilo de OpenCV por proceso para no saturar los núcleos"""
+    if OPENCV_AVAILABLE:
+        cv2.setNumThreads(1)
+
+
+def get_executor():
+    """Pool de procesos único, del tamaño de la cantidad de CPUs"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn evita heredar los hilos de la cámara y las conexiones abiertas
+            _executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _encode(image, detections):
+    ret, buffer = cv2.imencode('.jpg', image)
+    if not ret:
+        return None
+    # Tuplas simples para devolverlas al proceso principal
+    return [tuple(d) for d in detections], buffer.tobytes()
+
+
+def detect_image_bytes(data, max_size=DETECTION_MAX_SIZE, names=None, dnn=None):
+    """Decodificar, detectar y recodificar una imagen; devuelve (detecciones, jpeg) o None"""
+    nparr = np.frombuffer(data, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    with face_cascade() as cascade:
+        detections = DetectionPipeline(cascade, max_size=max_size, names=names, dnn=dnn).process(image)
+    return _encode(image, detections)
+
+
+def detect_image_group(group, max_size=DETECTION_MAX_SIZE, names=None, dnn=None):
+    """detect_image_bytes de varias imágenes con un solo pipeline y run_batch"""
+    images = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in group]
+    valid = [image for image in images if image is not None]
+    if not valid:
+        return [None] * len(images)
+
+    with face_cascade() as cascade:
+        pipeline = DetectionPipeline(cascade, max_size=max_size, names=names, dnn=dnn)
+        found = iter(pipeline.run_batch(valid))
+    results = []
+    for image in images:
+        if image is None:
+            results.append(None)
+            continue
+        detections = next(found)
+        pipeline.draw(image, detections)
+        results.append(_encode(image, detections))
+    return results
+
+
+def chunk_size():
+    """Imágenes de un lote que se leen y se mandan al pool a la vez: un grupo completo por proceso"""
+    return MAX_GROUP_SIZE * (os.cpu_count() or 1)
+
+
+def _group_size(count, workers):
+    """Imágenes por tarea: repartir entre todos los procesos sin pasar de MAX_GROUP_SIZE"""
+    return max(1, min(MAX_GROUP_SIZE, -(-count // workers)))
+
+
+def detect_many(images, max_size=DETECTION_MAX_SIZE, names=None, dnn=None):
+    """Procesar [(nombre, bytes)] en paralelo; devuelve los resultados en el mismo orden.
+
+    names: detectores a usar (None: los de uso por defecto); dnn: configuración del
+    detector dnn. Cada proceso analiza un grupo de imágenes en una pasada.
+    """
+    if not images:
+        return []
+    executor = get_executor()
+    size = _group_size(len(images), os.cpu_count() or 1)
+    groups = [images[start:start + size] for start in range(0, len(images), size)]
+    futures = [
+        executor.submit(detect_image_group, [data for _, data in group], max_size, names, dnn)
+        for group in groups
+    ]
+    results = []
+    for group, future in zip(groups, futures):
+        try:
+            results.extend(future.result())
+        except BrokenProcessPool as e:
+            # Un proceso murió: descartar el pool para que la próxima petición cree otro
+            print(f"Error procesando {', '.join(name for name, _ in group)}: {e}")
+            _reset_executor(executor)
+            results.extend([None] * len(group))
+        except Exception as e:
+            # Una imagen con error no debe cancelar el resto: repetir el grupo de a una
+            print(f"Error procesando {', '.join(name for name, _ in group)}: {e}")
+            results.extend(_detect_each(executor, group, max_size, names, dnn))
+    return results
+
+
+def _detect_each(executor, group, max_size, names, dnn):
+    results = []
+    for name, data in group:
+        try:
+            results.append(executor.submit(detect_image_bytes, data, max_size, names, dnn).result())
+        except BrokenProcessPool as e:
+            print(f"Error procesando {name}: {e}")
+            _reset_executor(executor)
+            results.append(None)
+        except Exception as e:
+            print(f"Error procesando {name}: {e}")
+            results.append(None)
+    return results
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+from .encoding import EncodedFrame
+from .metrics import ERRORS, VIEWER_FRAMES_SKIPPED
+
+# Segundos sin espectadores antes de detener el hilo productor
+IDLE_TIMEOUT = 5.0
+# Segundos que se guarda el lugar de un espectador que todavía no se suscribió
+RESERVATION_TIMEOUT = 10.0
+
+
+class FrameBroadcaster:
+    """Publica cada frame de la cámara una sola vez para todos los espectadores.
+
+    Los frames se publican como EncodedFrame: cada variante JPEG (calidad, ancho)
+    se codifica una vez y la comparten todos los espectadores que la piden.
+    """
+
+    def __init__(self, camera, idle_timeout=IDLE_TIMEOUT, on_idle=None):
+        self.camera = camera
+        self.idle_timeout = idle_timeout
+        # Se llama (sin locks tomados) cuando el productor se detiene por falta de espectadores
+        self.on_idle = on_idle
+        # Último pedido de un espectador que todavía no se suscribió
+        self.last_demand = time.time()
+        self.closed = False
+
+        # Último frame publicado: (secuencia, EncodedFrame) y las detecciones de la cámara para ese frame
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_snapshot = None
+        self.condition = threading.Condition()
+
+        self.subscribers = 0
+        # Vencimiento de cada lugar reservado con reserve() y aún no usado por subscribe()
+        self.reservations = []
+        # Espectadores asíncronos (ASGI): (event loop, cola de un solo (secuencia, frame, detecciones))
+        self.async_queues = set()
+        # Nombre de la cámara en las métricas
+        self.camera_name = getattr(camera, 'name', 'default')
+        self.running = False
+        self.worker = None
+
+    def _start_worker(self):
+        """Arrancar el hilo productor si no está corriendo (con el lock tomado)"""
+        if self.closed or (self.running and self.worker is not None and self.worker.is_alive()):
+            return
+        self.running = True
+        self.worker = threading.Thread(
+            target=self._produce_loop, name='frame-broadcaster', daemon=True
+        )
+        self.worker.start()
+
+    def _produce_loop(self):
+        """Detectar cada frame una vez y notificar a los suscriptores"""
+        idle_since = None
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                if self.subscribers == 0:
+                    if idle_since is None:
+                        idle_since = time.time()
+                    elif time.time() - max(idle_since, self.last_demand) > self.idle_timeout:
+                        # Nadie mira el stream: liberar la CPU
+                        self.running = False
+                        break
+                else:
+                    idle_since = None
+
+            if idle_since is not None:
+                time.sleep(0.05)
+                continue
+
+            try:
+                image = self.camera.get_image()
+            except Exception as e:
+                ERRORS.inc(stage='frame')
+                print(f"Error obteniendo frame: {e}")
+                time.sleep(0.1)
+                continue
+            if image is None:
+                # Cámara cerrada o sin señal: no girar en vacío
+                time.sleep(0.01)
+                continue
+            frame = EncodedFrame(image, self.camera_name)
+            # Solo este hilo lee de la cámara: el snapshot corresponde a este frame
+            snapshot = getattr(self.camera, 'snapshot', None)
+
+            with self.condition:
+                self.frame_seq += 1
+                self.frame = frame
+                self.frame_snapshot = snapshot
+                self.condition.notify_all()
+                item = (self.frame_seq, frame, snapshot)
+                async_queues = list(self.async_queues)
+
+            for loop, queue in async_queues:
+                try:
+                    loop.call_soon_threadsafe(_offer, queue, item, self.camera_name)
+                except RuntimeError:
+                    # El event loop ya se cerró
+                    with self.condition:
+                        self.async_queues.discard((loop, queue))
+
+        if self.on_idle is not None:
+            self.on_idle(self)
+
+    def reserve(self, max_viewers):
+        """Reservar el lugar de un espectador que se suscribirá enseguida; False si no hay lugar.
+
+        Los suscriptores solo se cuentan cuando empieza el stream: sin la reserva una
+        ráfaga de pedidos pasaría el límite antes de que ninguno se suscriba.
+        """
+        with self.condition:
+            now = time.time()
+            # Reservas de pedidos que nunca llegaron a suscribirse
+            self.reservations = [deadline for deadline in self.reservations if deadline > now]
+            if self.subscribers + len(self.reservations) >= max_viewers:
+                return False
+            self.reservations.append(now + RESERVATION_TIMEOUT)
+            self.last_demand = now
+            return True
+
+    def _add_subscriber(self):
+        """Contar un espectador, usando su reserva si la tiene (con el lock tomado)"""
+        if self.reservations:
+            self.reservations.pop(0)
+        self.subscribers += 1
+        self._start_worker()
+
+    def close_if_idle(self):
+        """Marcar el difusor como cerrado si sigue sin espectadores; devuelve True si se cerró"""
+        with self.condition:
+            if (self.subscribers == 0 and not self.running
+                    and time.time() - self.last_demand > self.idle_timeout):
+                self.closed = True
+            return self.closed
+
+    def wait_frame(self, last_seq=0, timeout=1.0):
+        """Esperar un frame más nuevo que last_seq y devolver (secuencia, frame)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_seq > last_seq, timeout=timeout)
+            if self.frame_seq <= last_seq:
+                return last_seq, None
+            return self.frame_seq, self.frame
+
+    def subscribe(self):
+        """Generador con los frames publicados; los espectadores lentos saltan frames"""
+        with self.condition:
+            self._add_subscriber()
+        try:
+            last_seq = self.frame_seq
+            while True:
+                seq, frame = self.wait_frame(last_seq)
+                if frame is None:
+                    with self.condition:
+                        if self.closed:
+                            # La cámara se liberó: terminar el stream
+                            return
+                        # El productor pudo detenerse por inactividad mientras esperábamos
+                        self._start_worker()
+                    continue
+                if last_seq and seq - last_seq > 1:
+                    VIEWER_FRAMES_SKIPPED.inc(seq - last_seq - 1, camera=self.camera_name)
+                last_seq = seq
+                yield frame
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    async def subscribe_async(self, with_snapshot=False):
+        """Versión asíncrona de subscribe: espera frames sin ocupar un hilo por espectador.
+
+        Con with_snapshot=True produce (secuencia, frame, DetectionSnapshot) en lugar del frame solo.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1)
+        entry = (loop, queue)
+        with self.condition:
+            self.async_queues.add(entry)
+            self._add_subscriber()
+        try:
+            while True:
+                # asyncio.wait y no wait_for: wait_for puede perder una cancelación
+                # que llega justo cuando la cola entrega un frame
+                getter = asyncio.ensure_future(queue.get())
+                try:
+                    done, _ = await asyncio.wait({getter}, timeout=1.0)
+                finally:
+                    if not getter.done():
+                        getter.cancel()
+                if not done:
+                    with self.condition:
+                        if self.closed:
+                            return
+                        # El productor pudo detenerse por inactividad mientras esperábamos
+                        self._start_worker()
+                    continue
+                item = getter.result()
+                yield item if with_snapshot else item[1]
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+                self.async_queues.discard(entry)
+
+    def stop(self):
+        """Detener el hilo productor"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+
+def _offer(queue, item, camera_name='default'):
+    """Dejar en la cola solo el frame más nuevo (se ejecuta en el event loop)"""
+    if queue.full():
+        queue.get_nowait()
+        # El espectador no alcanzó a leer el frame anterior
+        VIEWER_FRAMES_SKIPPED.inc(camera=camera_name)
+    queue.put_nowait(item)
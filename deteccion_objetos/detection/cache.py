@@ -0,0 +1,86 @@
+import json
+import threading
+from collections import OrderedDict
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import DetectionResult
+
+# Resultados recientes guardados en memoria, por hash de contenido
+CACHE_SIZE = 256
+
+
+class LRUCache:
+    """Diccionario acotado que descarta primero lo usado hace más tiempo"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+upload_cache = LRUCache()
+
+
+def find_by_hash(content_hash):
+    """Buscar una subida ya procesada: primero en memoria y luego en la base de datos"""
+    detection_result = upload_cache.get(content_hash)
+    if detection_result is not None:
+        return detection_result
+
+    detection_result = (
+        DetectionResult.objects
+        .filter(content_hash=content_hash)
+        .exclude(processed_image='')
+        .order_by('-created_at')
+        .first()
+    )
+    if detection_result is not None:
+        upload_cache.set(content_hash, detection_result)
+    return detection_result
+
+
+def remember(detection_result):
+    """Guardar en memoria un resultado recién procesado"""
+    if detection_result.content_hash:
+        upload_cache.set(detection_result.content_hash, detection_result)
+
+
+def cached_objects(detection_result):
+    """Lista de objetos detectados de un registro guardado"""
+    try:
+        return json.loads(detection_result.objects_detected) if detection_result.objects_detected else []
+    except ValueError:
+        return []
+
+
+@receiver(post_delete, sender=DetectionResult)
+def forget_deleted(sender, instance, **kwargs):
+    """Un registro borrado no puede seguir respondiendo desde la caché"""
+    if instance.content_hash:
+        upload_cache.discard(instance.content_hash)
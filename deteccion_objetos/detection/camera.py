@@ -0,0 +1,306 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from .metrics import (ERRORS, FRAMES_CAPTURED, FRAMES_DROPPED, FRAMES_PROCESSED, FRAMES_REUSED,
+                      STAGE_SECONDS, observe_timings)
+from .motion import MotionGate
+from .persistence import get_writer
+from .pipeline import TRACK_FULL_EVERY, DetectionPipeline
+from .resources import FACE_CASCADE, OPENCV_AVAILABLE, cv2, get_pool
+from .workers import ProcessDetector
+
+# Cantidad de frames que guarda el buffer circular de captura
+FRAME_BUFFER_SIZE = 2
+# Resolución pedida a la cámara
+CAPTURE_WIDTH = 640
+CAPTURE_HEIGHT = 480
+# Confianza asignada a las detecciones heurísticas del video
+DEFAULT_CONFIDENCE = 0.8
+
+# Últimas detecciones publicadas: seq cambia solo cuando cambian las detecciones
+DetectionSnapshot = namedtuple('DetectionSnapshot', ['seq', 'frame_seq', 'timestamp', 'detections'])
+
+
+class VideoCamera:
+    def __init__(self, source=None, width=CAPTURE_WIDTH, height=CAPTURE_HEIGHT, max_fps=None,
+                 buffer_size=FRAME_BUFFER_SIZE, motion_gate=True, track_every=TRACK_FULL_EVERY,
+                 worker_process=False, name='default', detectors=None, detection_budget=None,
+                 dnn=None):
+        """source: índice de cámara, URI (rtsp://, http://) o ruta de un archivo de video.
+
+        Sin source se usa la cámara 0 y, si no está disponible, la 1.
+        Con worker_process la detección corre en un proceso aparte (ver workers.py).
+        name identifica a la cámara en las métricas.
+        detectors: nombres de detectores registrados (None: los de uso por defecto);
+        detection_budget: segundos por frame para detectar, ver DetectorBudget;
+        dnn: configuración del detector dnn (settings.DETECTION_DNN).
+        motion_gate: True, False o {'threshold', 'min_changed', 'max_skip'} para MotionGate.
+        """
+        if not OPENCV_AVAILABLE:
+            raise Exception("OpenCV no está disponible")
+
+        self.source = source
+        self.name = name
+        if source is None:
+            self.video = cv2.VideoCapture(0)
+            if not self.video.isOpened():
+                # Si la cámara principal no está disponible, intentar con índice 1
+                self.video = cv2.VideoCapture(1)
+        else:
+            self.video = cv2.VideoCapture(source)
+
+        if width and height:
+            self.video.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.video.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+        # Un archivo se reproduce en bucle y, salvo otro límite, a su velocidad nominal
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        if max_fps is None and self.is_file:
+            max_fps = self.video.get(cv2.CAP_PROP_FPS) or None
+        self.frame_interval = 1.0 / max_fps if max_fps else 0
+
+        # Cargar el clasificador Haar Cascade para detección de rostros
+        # La cámara conserva su instancia del pool mientras esté activa
+        try:
+            self.face_cascade = get_pool(FACE_CASCADE).acquire()
+        except:
+            self.face_cascade = None
+
+        # Los rostros se buscan en todo el frame solo cada track_every frames
+        self.pipeline = DetectionPipeline(self.face_cascade, track_every=track_every,
+                                          names=detectors, budget=detection_budget, dnn=dnn)
+        self.detection_enabled = True
+
+        # Proceso de detección propio; mientras arranca (o si falla) se detecta aquí
+        self.detector = None
+        if worker_process and self.face_cascade is not None:
+            try:
+                self.detector = ProcessDetector(track_every=track_every, names=detectors,
+                                                budget=detection_budget, dnn=dnn)
+            except Exception as e:
+                print(f"Error iniciando el proceso de detección: {e}")
+
+        # Si la escena no cambia se reutilizan las detecciones anteriores
+        if isinstance(motion_gate, dict):
+            self.motion_gate = MotionGate(**motion_gate)
+        else:
+            self.motion_gate = MotionGate() if motion_gate else None
+        self.last_detections = None
+
+        # Detecciones publicadas para /detect/ y su stream
+        self.snapshot = DetectionSnapshot(0, 0, None, [])
+        self.snapshot_condition = threading.Condition()
+        # (event loop, asyncio.Event) de quienes esperan con wait_detections_async
+        self.snapshot_waiters = set()
+
+        # Buffer circular con los últimos frames capturados: (secuencia, frame, hora de captura)
+        self.frames = deque(maxlen=buffer_size)
+        self.frame_seq = 0
+        self.last_processed_seq = 0
+        self.frame_condition = threading.Condition()
+
+        # Hilo dedicado a leer de la cámara continuamente
+        self.running = True
+        self.capture_thread = threading.Thread(
+            target=self._capture_loop, name='video-capture', daemon=True
+        )
+        self.capture_thread.start()
+
+    def __del__(self):
+        self.release()
+
+    def release(self):
+        """Detener el hilo de captura y liberar la cámara"""
+        self.running = False
+        for name in ('frame_condition', 'snapshot_condition'):
+            condition = getattr(self, name, None)
+            if condition is not None:
+                with condition:
+                    condition.notify_all()
+        self._wake_snapshot_waiters()
+        thread = getattr(self, 'capture_thread', None)
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+        if getattr(self, 'video', None) is not None:
+            self.video.release()
+        if getattr(self, 'detector', None) is not None:
+            self.detector.stop()
+            self.detector = None
+        if getattr(self, 'face_cascade', None) is not None:
+            get_pool(FACE_CASCADE).release(self.face_cascade)
+            self.face_cascade = None
+
+    def _capture_loop(self):
+        """Leer frames de la cámara y dejarlos en el buffer circular"""
+        last_read = 0
+        while self.running:
+            if not self.video or not self.video.isOpened():
+                time.sleep(0.1)
+                continue
+
+            if self.frame_interval:
+                # Límite de FPS de esta cámara
+                wait = last_read + self.frame_interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+            last_read = time.time()
+
+            started = time.perf_counter()
+            success, image = self.video.read()
+            if not success:
+                if self.is_file:
+                    self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                time.sleep(0.01)
+                continue
+            STAGE_SECONDS.observe(time.perf_counter() - started, camera=self.name, stage='capture')
+            FRAMES_CAPTURED.inc(camera=self.name)
+
+            with self.frame_condition:
+                self.frame_seq += 1
+                # El deque descarta solo el frame más antiguo al llenarse
+                self.frames.append((self.frame_seq, image, time.time()))
+                self.frame_condition.notify_all()
+
+    def read_latest(self, last_seq=0, timeout=1.0):
+        """Devolver (secuencia, frame, hora de captura) del frame más nuevo posterior a last_seq"""
+        with self.frame_condition:
+            self.frame_condition.wait_for(
+                lambda: not self.running or (self.frames and self.frames[-1][0] > last_seq),
+                timeout=timeout
+            )
+            if not self.frames or self.frames[-1][0] <= last_seq:
+                return last_seq, None, None
+            return self.frames[-1]
+
+    def wait_detections(self, last_seq=0, timeout=15.0):
+        """Esperar detecciones distintas de las de last_seq; devuelve el último DetectionSnapshot"""
+        with self.snapshot_condition:
+            self.snapshot_condition.wait_for(
+                lambda: not self.running or self.snapshot.seq != last_seq,
+                timeout=timeout
+            )
+            return self.snapshot
+
+    async def wait_detections_async(self, last_seq=0, timeout=15.0):
+        """Versión asíncrona de wait_detections: espera en el event loop sin ocupar un hilo"""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self.snapshot_condition:
+            if not self.running or self.snapshot.seq != last_seq:
+                return self.snapshot
+            self.snapshot_waiters.add(entry)
+        try:
+            await asyncio.wait_for(entry[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.snapshot_condition:
+                self.snapshot_waiters.discard(entry)
+        return self.snapshot
+
+    def _wake_snapshot_waiters(self):
+        condition = getattr(self, 'snapshot_condition', None)
+        if condition is None:
+            return
+        with condition:
+            waiters = list(self.snapshot_waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # El event loop ya se cerró
+                pass
+
+    def _publish_detections(self, detections, frame_seq, timestamp):
+        """Publicar las detecciones del frame si difieren de las anteriores"""
+        # Cajas como tuplas de int: comparables y serializables a JSON
+        detections = [d._replace(box=tuple(int(v) for v in d.box)) for d in detections]
+        with self.snapshot_condition:
+            previous = self.snapshot
+            if frame_seq and frame_seq <= previous.frame_seq:
+                return
+            if previous.seq and detections == previous.detections:
+                return
+            self.snapshot = DetectionSnapshot(previous.seq + 1, frame_seq, timestamp, detections)
+            self.snapshot_condition.notify_all()
+        self._wake_snapshot_waiters()
+
+    def get_frame(self):
+        image = self.get_image()
+        if image is None:
+            return None
+        ret, jpeg = cv2.imencode('.jpg', image)
+        if ret:
+            return jpeg.tobytes()
+        return None
+
+    def get_image(self):
+        """Frame más reciente ya anotado con las detecciones, sin codificar"""
+        if not self.video or not self.video.isOpened():
+            return None
+
+        # Tomar siempre el frame más reciente; los frames intermedios se descartan
+        seq, image, captured_at = self.read_latest(self.last_processed_seq)
+        if image is None:
+            return None
+        if self.last_processed_seq and seq - self.last_processed_seq > 1:
+            # Frames que el buffer descartó porque la detección no dio abasto
+            FRAMES_DROPPED.inc(seq - self.last_processed_seq - 1, camera=self.name)
+        self.last_processed_seq = seq
+
+        if self.detection_enabled and self.face_cascade is not None:
+            image = self.detect_objects(image, seq, captured_at)
+        FRAMES_PROCESSED.inc(camera=self.name)
+        return image
+
+    def detect_objects(self, frame, frame_seq=0, captured_at=None):
+        try:
+            with STAGE_SECONDS.time(camera=self.name, stage='motion'):
+                changed = self.motion_gate is None or self.motion_gate.changed(frame)
+            if changed or self.last_detections is None:
+                with STAGE_SECONDS.time(camera=self.name, stage='detect'):
+                    detections = self._run_pipeline(frame)
+                self.last_detections = detections
+            else:
+                FRAMES_REUSED.inc(camera=self.name)
+                detections = self.last_detections
+            self._publish_detections(detections, frame_seq, captured_at or time.time())
+            with STAGE_SECONDS.time(camera=self.name, stage='draw'):
+                self.pipeline.draw(frame, detections)
+            # Almacenar detección si hay objetos encontrados
+            if detections:
+                self.save_detection(detections)
+
+        except Exception as e:
+            ERRORS.inc(stage='detect')
+            print(f"Error en detección: {e}")
+
+        return frame
+
+    def _run_pipeline(self, frame):
+        """Detecciones del frame, en el proceso de detección si está listo"""
+        detector = self.detector
+        if detector is not None:
+            try:
+                if detector.is_ready():
+                    detections = detector.run(frame)
+                    observe_timings(self.name, detector.last_timings)
+                    return detections
+            except Exception as e:
+                # Proceso caído o sin respuesta: seguir detectando en este proceso
+                ERRORS.inc(stage='worker')
+                print(f"Error en el proceso de detección: {e}")
+                self.detector = None
+                detector.stop()
+        detections = self.pipeline.run(frame)
+        observe_timings(self.name, self.pipeline.last_timings)
+        return detections
+
+    def save_detection(self, detections):
+        """Encolar la detección; el escritor en segundo plano la guarda en bloque"""
+        try:
+            get_writer().submit(detections, default_confidence=DEFAULT_CONFIDENCE)
+        except Exception as e:
+            ERRORS.inc(stage='save')
+            print(f"Error guardando detección: {e}")
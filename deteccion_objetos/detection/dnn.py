@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from .resources import cv2, np
+
+# Detector basado en una red neuronal local (ONNX, Caffe, TensorFlow o Darknet)
+# ejecutada con cv2.dnn en CPU; la configuración (settings.DETECTION_DNN)
+# llega como dict a cada proceso.
+
+# Formatos de salida soportados:
+#   yolov5: (lote, N, 5 + clases) con cx, cy, w, h en píxeles de la entrada y objectness
+#   yolov8: (lote, 4 + clases, N), sin objectness
+#   ssd:    (1, 1, N, 7) con [imagen, clase, confianza, x1, y1, x2, y2] normalizados
+FORMATS = ('yolov5', 'yolov8', 'ssd')
+
+DNN_DEFAULTS = {
+    'model': None,
+    # Archivo de configuración para formatos que lo necesitan (.prototxt, .cfg, .pbtxt)
+    'config': None,
+    'format': 'yolov5',
+    'input_size': 640,
+    'scale': 1 / 255,
+    'mean': (0, 0, 0),
+    'swap_rb': True,
+    # Nombres de las clases del modelo: lista o archivo con uno por línea
+    'classes': None,
+    # {clase del modelo: etiqueta a informar}; solo se informan esas clases. None: todas
+    'labels': None,
+    'confidence': 0.5,
+    'nms': 0.45,
+    # Imágenes por pasada de la red
+    'batch_size': 8,
+}
+
+
+def dnn_config(value):
+    """Completar una configuración DETECTION_DNN con los valores por defecto"""
+    config = {**DNN_DEFAULTS, **value}
+    if config['format'] not in FORMATS:
+        raise ValueError(f"Formato de red desconocido: {config['format']}")
+    if not config['model']:
+        raise ValueError("DETECTION_DNN necesita 'model'")
+    return config
+
+
+def _load_classes(classes):
+    if classes is None or isinstance(classes, (list, tuple)):
+        return classes
+    with open(classes, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class DnnModel:
+    """Red cargada una vez por proceso; las pasadas se serializan porque Net no es reentrante"""
+
+    def __init__(self, config):
+        self.config = dnn_config(config)
+        model = os.fspath(self.config['model'])
+        if not os.path.isfile(model):
+            raise ValueError(f"No existe el modelo {model}")
+        self.net = cv2.dnn.readNet(model, os.fspath(self.config['config'] or ''))
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.classes = _load_classes(self.config['classes'])
+        self._lock = threading.Lock()
+        self.batch_size = max(1, int(self.config['batch_size']))
+        if self.batch_size > 1 and not self._accepts_batches():
+            # Modelo exportado con lote fijo de 1: pasar de a una imagen
+            self.batch_size = 1
+
+    def _accepts_batches(self):
+        """Probar una vez al cargar si la red acepta más de una imagen por pasada"""
+        size = self.config['input_size']
+        blank = np.zeros((size, size, 3), dtype=np.uint8)
+        try:
+            self._forward([blank, blank])
+        except cv2.error:
+            return False
+        return True
+
+    def _forward(self, images):
+        size = self.config['input_size']
+        blob = cv2.dnn.blobFromImages(
+            images, self.config['scale'], (size, size), self.config['mean'],
+            self.config['swap_rb'], False,
+        )
+        with self._lock:
+            self.net.setInput(blob)
+            return self.net.forward()
+
+    def label(self, class_id):
+        """Etiqueta a informar para una clase del modelo, o None si no se informa"""
+        name = self.classes[class_id] if self.classes and class_id < len(self.classes) else f'class_{class_id}'
+        labels = self.config['labels']
+        if labels is None:
+            return name
+        return labels.get(name)
+
+    def detect(self, images):
+        """[(etiqueta, (x, y, w, h), confianza)] por imagen, en pasadas de hasta batch_size"""
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            results.extend(self._detect_chunk(images[start:start + self.batch_size]))
+        return results
+
+    def _detect_chunk(self, images):
+        output = self._forward(images)
+        return [self._parse(output, i, image.shape) for i, image in enumerate(images)]
+
+    def _parse(self, output, index, shape):
+        height, width = shape[:2]
+        size = self.config['input_size']
+        fmt = self.config['format']
+        if fmt == 'ssd':
+            rows = output.reshape(-1, 7)
+            rows = rows[rows[:, 0] == index]
+            scores = rows[:, 2]
+            class_ids = rows[:, 1].astype(int)
+            x1, y1 = rows[:, 3] * width, rows[:, 4] * height
+            boxes = np.stack([x1, y1, rows[:, 5] * width - x1, rows[:, 6] * height - y1], axis=1)
+        else:
+            rows = output[index]
+            if fmt == 'yolov8':
+                rows = rows.T
+                class_scores = rows[:, 4:]
+            else:
+                class_scores = rows[:, 5:] * rows[:, 4:5]
+            class_ids = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(rows)), class_ids]
+            # Centro y tamaño en píxeles de la entrada: llevarlos a la imagen
+            sx, sy = width / size, height / size
+            w, h = rows[:, 2] * sx, rows[:, 3] * sy
+            boxes = np.stack([rows[:, 0] * sx - w / 2, rows[:, 1] * sy - h / 2, w, h], axis=1)
+
+        keep = scores >= self.config['confidence']
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+        if not len(scores):
+            return []
+        indices = cv2.dnn.NMSBoxesBatched(
+            boxes.tolist(), scores.tolist(), class_ids.tolist(),
+            self.config['confidence'], self.config['nms'],
+        )
+        detections = []
+        for i in np.array(indices).flatten():
+            label = self.label(int(class_ids[i]))
+            if label is None:
+                continue
+            x, y, w, h = boxes[i]
+            x, y = max(int(x), 0), max(int(y), 0)
+            detections.append((label, (x, y, int(w), int(h)), round(float(scores[i]), 4)))
+        return detections
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(config):
+    """Modelo único por proceso para esa configuración"""
+    key = json.dumps(config, sort_keys=True, default=str)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = DnnModel(config)
+        return model
@@ -0,0 +1,98 @@
+import threading
+import time
+from .metrics import STAGE_SECONDS
+from .resources import cv2
+
+# Niveles de calidad JPEG del modo automático; pocos niveles para que los
+# espectadores compartan las mismas variantes
+QUALITY_LEVELS = (30, 40, 50, 60, 70, 80, 90)
+INITIAL_QUALITY_LEVEL = 5
+# Si enviar un frame tarda más que esto se baja la calidad
+SEND_BUDGET = 0.1
+# Frames seguidos enviados en menos de la mitad del presupuesto antes de subir la calidad
+RAISE_AFTER = 30
+# Ancho mínimo aceptado en ?w=
+MIN_WIDTH = 160
+
+
+class EncodedFrame:
+    """Frame anotado que se codifica a JPEG una sola vez por variante (calidad, ancho)"""
+
+    def __init__(self, image, camera='default'):
+        self.image = image
+        # Cámara de origen, para las métricas
+        self.camera = camera
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def cached(self, quality=None, width=None):
+        """Bytes de la variante si ya se codificó, None si no"""
+        return self._variants.get((quality, width))
+
+    def encode(self, quality=None, width=None):
+        """JPEG de la variante pedida; lo codifica el primer espectador que la pide"""
+        key = (quality, width)
+        data = self._variants.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            data = self._variants.get(key)
+            if data is None:
+                started = time.perf_counter()
+                data = encode_jpeg(self.image, quality, width)
+                STAGE_SECONDS.observe(time.perf_counter() - started, camera=self.camera, stage='encode')
+                self._variants[key] = data
+        return data
+
+
+def encode_jpeg(image, quality=None, width=None):
+    """Codificar a JPEG, reduciendo al ancho pedido si es menor que el original"""
+    if width is not None and width < image.shape[1]:
+        height = max(1, round(image.shape[0] * width / image.shape[1]))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality is not None else []
+    ret, jpeg = cv2.imencode('.jpg', image, params)
+    return jpeg.tobytes() if ret else None
+
+
+class AdaptiveQuality:
+    """Ajusta la calidad JPEG de un espectador según lo que tarda en enviarle cada frame"""
+
+    def __init__(self, level=INITIAL_QUALITY_LEVEL, budget=SEND_BUDGET, raise_after=RAISE_AFTER):
+        self.level = level
+        self.budget = budget
+        self.raise_after = raise_after
+        self.fast_frames = 0
+
+    @property
+    def quality(self):
+        return QUALITY_LEVELS[self.level]
+
+    def update(self, send_seconds):
+        if send_seconds > self.budget:
+            # Cliente o red lentos: bajar un nivel enseguida
+            self.level = max(0, self.level - 1)
+            self.fast_frames = 0
+        elif send_seconds < self.budget / 2:
+            self.fast_frames += 1
+            if self.fast_frames >= self.raise_after:
+                self.level = min(len(QUALITY_LEVELS) - 1, self.level + 1)
+                self.fast_frames = 0
+        else:
+            self.fast_frames = 0
+
+
+def parse_stream_params(params):
+    """(calidad, ancho) de ?q= y ?w=; calidad None significa automática.
+
+    Lanza ValueError si los valores no son válidos.
+    """
+    quality = params.get('q', 'auto')
+    quality = None if quality in ('', 'auto') else int(quality)
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError('q debe estar entre 1 y 100')
+
+    width = params.get('w') or None
+    if width is not None:
+        width = max(MIN_WIDTH, int(width))
+    return quality, width
@@ -0,0 +1,139 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from detection.camera import DEFAULT_CONFIDENCE
+from detection.dnn import dnn_config
+from detection.persistence import EventGrouper, write_events
+from detection.pipeline import DETECTION_MAX_SIZE, parse_detector_names, resolve_detectors
+from detection.video import analyze_range, create_executor, frame_ranges, iter_detections, video_info
+
+# Eventos acumulados antes de escribir en bloque
+WRITE_BATCH = 500
+
+
+class Command(BaseCommand):
+    help = "Analizar videos grabados (cualquier origen que abra cv2.VideoCapture) y guardar las detecciones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help='Rutas de video o URIs')
+        parser.add_argument('--stride', type=int, default=1,
+                            help='Analizar uno de cada N frames (por defecto todos)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos; con más de uno cada archivo se divide por rangos de frames')
+        parser.add_argument('--chunks', type=int,
+                            help='Rangos en que se divide cada archivo (por defecto, uno por proceso)')
+        parser.add_argument('--max-frames', type=int,
+                            help='Leer como máximo N frames de cada origen')
+        parser.add_argument('--max-size', type=int,
+                            help='Lado mayor de la imagen de trabajo (por defecto DETECTION_MAX_SIZE)')
+        parser.add_argument('--track-every', type=int, default=0,
+                            help='Buscar rostros en todo el frame cada N frames analizados (0: siempre)')
+        parser.add_argument('--detectors',
+                            help='Detectores separados por comas (por defecto todos los de uso general; dnn se pide aparte)')
+        parser.add_argument('--recorded-at',
+                            help='Fecha y hora ISO del inicio del video (por defecto, ahora)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Analizar sin guardar en la base de datos')
+
+    def handle(self, *args, **options):
+        if options['stride'] < 1 or options['workers'] < 1:
+            raise CommandError('--stride y --workers deben ser mayores que 0')
+        if options['max_size'] is None:
+            options['max_size'] = getattr(settings, 'DETECTION_MAX_SIZE', DETECTION_MAX_SIZE)
+        options['detectors'] = parse_detector_names(options['detectors'])
+        options['dnn'] = getattr(settings, 'DETECTION_DNN', None)
+        try:
+            if 'dnn' in resolve_detectors(options['detectors']):
+                if not options['dnn']:
+                    raise ValueError("El detector dnn necesita settings.DETECTION_DNN")
+                dnn_config(options['dnn'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        recorded_at = timezone.now()
+        if options['recorded_at']:
+            recorded_at = parse_datetime(options['recorded_at'])
+            if recorded_at is None:
+                raise CommandError(f"Fecha no válida: {options['recorded_at']}")
+            if timezone.is_naive(recorded_at):
+                recorded_at = timezone.make_aware(recorded_at)
+
+        executor = create_executor(options['workers']) if options['workers'] > 1 else None
+        try:
+            for source in options['sources']:
+                self.analyze(source, executor, recorded_at, options)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def analyze(self, source, executor, recorded_at, options):
+        try:
+            total, fps = video_info(source)
+        except IOError as e:
+            raise CommandError(str(e))
+
+        end = total or None
+        if options['max_frames']:
+            end = min(end, options['max_frames']) if end else options['max_frames']
+        args = (options['stride'], options['max_size'], options['track_every'], options['detectors'], options['dnn'])
+
+        # Frames leídos del origen, muestreados o no
+        stats = {'read': 0}
+        started = time.perf_counter()
+        if executor is not None and end:
+            # Cada proceso abre el archivo, salta al inicio de su rango y lo analiza;
+            # los resultados se recorren en orden para agrupar igual que en serie
+            ranges = frame_ranges(end, options['chunks'] or options['workers'])
+            futures = [executor.submit(analyze_range, source, start, stop, *args) for start, stop in ranges]
+            results = range_results(futures, stats)
+        else:
+            if executor is not None:
+                self.stderr.write(f"{source}: cantidad de frames desconocida, se analiza en un solo proceso")
+            results = iter_detections(source, args[0], 0, end, *args[1:], stats=stats)
+
+        # Marca de tiempo de cada frame: inicio de la grabación más su posición en el video
+        base = recorded_at.timestamp()
+        grouper = EventGrouper(DEFAULT_CONFIDENCE)
+        pending = []
+        analyzed = objects = records = 0
+        try:
+            for index, detections in results:
+                analyzed += 1
+                objects += len(detections)
+                event = grouper.add(detections, base + index / fps)
+                if event is not None:
+                    pending.append(event)
+                if len(pending) >= WRITE_BATCH:
+                    records += self.write(pending, options['dry_run'])
+                    pending = []
+        except KeyboardInterrupt:
+            self.stderr.write(f"{source}: interrumpido, guardando lo analizado")
+        event = grouper.close()
+        if event is not None:
+            pending.append(event)
+        if pending:
+            records += self.write(pending, options['dry_run'])
+
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        read = stats['read']
+        self.stdout.write(
+            f"{source}: {analyzed} frames analizados de {read} en {elapsed:.1f} s "
+            f"({analyzed / elapsed:.1f} fps analizados, {read / elapsed:.1f} fps de video), "
+            f"{objects} objetos, {records} registros"
+            + (" (sin guardar)" if options['dry_run'] else "")
+        )
+
+    def write(self, events, dry_run):
+        if not dry_run:
+            write_events(events)
+        return len(events)
+
+
+def range_results(futures, stats):
+    """Resultados de los rangos en orden, sumando a stats['read'] los frames leídos por cada uno"""
+    for future in futures:
+        results, read = future.result()
+        stats['read'] += read
+        yield from results
@@ -0,0 +1,202 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas en memoria del proceso, expuestas en /metrics/ con el formato de
+# texto de Prometheus. Registrar un valor es tomar un lock y sumar: se puede
+# hacer en cada frame. No importa Django, así lo pueden usar todos los módulos.
+
+# Límites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def samples(self):
+        """[(sufijo, valores de etiquetas, etiqueta extra, valor)] a exponer"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Valor que solo crece (frames, errores); Prometheus calcula la tasa con rate()"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', key, '', value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Valor que se lee al exponer las métricas (profundidad de colas, espectadores).
+
+    callback devuelve un número o, si hay etiquetas, {valores de etiquetas: número}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception as e:
+                print(f"Error leyendo la métrica {self.name}: {e}")
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = sorted((tuple(str(v) for v in key), value) for key, value in values.items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [('', key, '', value) for key, value in items]
+
+
+class Histogram(Metric):
+    """Distribución de duraciones en segundos por rangos acumulados"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [conteo por rango (el último es +Inf), suma]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', key, f'le="{_format_value(float(bound))}"', cumulative))
+            samples.append(('_sum', key, '', total))
+            samples.append(('_count', key, '', cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Al recargar un módulo se conserva la métrica ya registrada
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Duración de cada etapa del video: captura, representaciones y cada detector,
+# dibujo y codificación JPEG
+STAGE_SECONDS = registry.histogram(
+    'detection_stage_seconds', 'Duración de cada etapa del procesamiento de video', ('camera', 'stage'))
+FRAMES_CAPTURED = registry.counter(
+    'detection_frames_captured_total', 'Frames leídos de la cámara', ('camera',))
+FRAMES_PROCESSED = registry.counter(
+    'detection_frames_processed_total', 'Frames anotados y publicados', ('camera',))
+FRAMES_REUSED = registry.counter(
+    'detection_frames_reused_total', 'Frames sin movimiento que reutilizaron las detecciones anteriores', ('camera',))
+FRAMES_DROPPED = registry.counter(
+    'detection_frames_dropped_total', 'Frames capturados que no llegaron a procesarse', ('camera',))
+VIEWER_FRAMES_SKIPPED = registry.counter(
+    'detection_viewer_frames_skipped_total', 'Frames publicados que un espectador lento no recibió', ('camera',))
+ERRORS = registry.counter(
+    'detection_errors_total', 'Errores por etapa', ('stage',))
+
+
+def observe_timings(camera, timings):
+    """Registrar {etapa: segundos} (p. ej. DetectionPipeline.last_timings) de una cámara"""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, camera=camera, stage=stage)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionresult',
+            name='duration',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='detectionresult',
+            name='frame_count',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0003_detectionresult_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectedObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=50)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('x', models.IntegerField(blank=True, null=True)),
+                ('y', models.IntegerField(blank=True, null=True)),
+                ('width', models.IntegerField(blank=True, null=True)),
+                ('height', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('detection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detected_objects', to='detection.detectionresult')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['label', 'created_at'], name='detection_d_label_9b050e_idx'), models.Index(fields=['created_at'], name='detection_d_created_94144d_idx')],
+            },
+        ),
+    ]
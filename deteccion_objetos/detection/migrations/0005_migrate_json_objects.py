@@ -0,0 +1,51 @@
+import json
+
+from django.db import migrations
+
+
+def forwards(apps, schema_editor):
+    """Crear una fila DetectedObject por cada etiqueta guardada en el JSON"""
+    DetectionResult = apps.get_model('detection', 'DetectionResult')
+    DetectedObject = apps.get_model('detection', 'DetectedObject')
+
+    batch = []
+    for detection in DetectionResult.objects.only(
+            'id', 'objects_detected', 'confidence_scores', 'created_at').iterator(chunk_size=2000):
+        try:
+            labels = json.loads(detection.objects_detected) if detection.objects_detected else []
+        except ValueError:
+            continue
+        try:
+            scores = json.loads(detection.confidence_scores) if detection.confidence_scores else []
+        except ValueError:
+            scores = []
+
+        for i, label in enumerate(labels):
+            score = scores[i] if i < len(scores) else None
+            batch.append(DetectedObject(
+                detection_id=detection.id,
+                label=str(label)[:50],
+                confidence=score if isinstance(score, (int, float)) else None,
+                created_at=detection.created_at,
+            ))
+        if len(batch) >= 2000:
+            DetectedObject.objects.bulk_create(batch)
+            batch = []
+
+    if batch:
+        DetectedObject.objects.bulk_create(batch)
+
+
+def backwards(apps, schema_editor):
+    apps.get_model('detection', 'DetectedObject').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0004_detectedobject'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
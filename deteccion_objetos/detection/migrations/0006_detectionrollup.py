@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0005_migrate_json_objects'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('minute', 'Minuto'), ('hour', 'Hora')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('label', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0)),
+                ('confidence_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['period', 'bucket', 'label'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'label'), name='unique_rollup_bucket')],
+            },
+        ),
+    ]
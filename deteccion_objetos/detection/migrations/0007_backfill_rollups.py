@@ -0,0 +1,43 @@
+from datetime import timezone as dt_timezone
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour, TruncMinute
+
+
+def forwards(apps, schema_editor):
+    """Calcular los resúmenes de los objetos ya guardados"""
+    DetectedObject = apps.get_model('detection', 'DetectedObject')
+    DetectionRollup = apps.get_model('detection', 'DetectionRollup')
+
+    for period, trunc in (('minute', TruncMinute), ('hour', TruncHour)):
+        rows = (
+            DetectedObject.objects
+            .order_by()
+            .annotate(bucket=trunc('created_at', tzinfo=dt_timezone.utc))
+            .values('bucket', 'label')
+            .annotate(
+                count=Count('id'),
+                confidence_sum=Sum('confidence', default=0.0),
+                confidence_count=Count('confidence'),
+            )
+        )
+        DetectionRollup.objects.bulk_create(
+            (DetectionRollup(period=period, **row) for row in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+def backwards(apps, schema_editor):
+    apps.get_model('detection', 'DetectionRollup').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection', '0006_detectionrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
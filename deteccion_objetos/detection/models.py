@@ -7,10 +7,94 @@ class DetectionResult(models.Model):
     objects_detected = models.TextField(blank=True)
     confidence_scores = models.TextField(blank=True)
     detection_count = models.IntegerField(default=0)
+    # Frames consecutivos idénticos agrupados en este registro y su duración en segundos
+    frame_count = models.IntegerField(default=1)
+    duration = models.FloatField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
+    # SHA-256 de la imagen subida, para no reprocesar imágenes repetidas
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return f"Detection {self.id} - {self.detection_count} objects found"
+
+
+class DetectedObject(models.Model):
+    """Un objeto detectado, con su caja, para poder consultar por etiqueta en SQL"""
+    detection = models.ForeignKey(DetectionResult, on_delete=models.CASCADE, related_name='detected_objects')
+    label = models.CharField(max_length=50)
+    confidence = models.FloatField(null=True, blank=True)
+    # Caja en píxeles de la imagen original; vacía en registros migrados del JSON
+    x = models.IntegerField(null=True, blank=True)
+    y = models.IntegerField(null=True, blank=True)
+    width = models.IntegerField(null=True, blank=True)
+    height = models.IntegerField(null=True, blank=True)
+    # Copia de detection.created_at para filtrar por fecha sin JOIN
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # (label, created_at) también sirve para filtrar solo por etiqueta
+            models.Index(fields=['label', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.label} ({self.detection_id})"
+    
+    @property
+    def box(self):
+        if self.x is None:
+            return None
+        return (self.x, self.y, self.width, self.height)
+
+
+
+class DetectionRollup(models.Model):
+    """Conteo acumulado de objetos por etiqueta en un intervalo de tiempo"""
+    PERIOD_CHOICES = [
+        ('minute', 'Minuto'),
+        ('hour', 'Hora'),
+    ]
+    
+    period = models.CharField(max_length=6, choices=PERIOD_CHOICES)
+    # Inicio del intervalo (truncado al minuto o a la hora, en UTC)
+    bucket = models.DateTimeField()
+    label = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+    # Suma y cantidad de confianzas conocidas, para calcular el promedio
+    confidence_sum = models.FloatField(default=0)
+    confidence_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['period', 'bucket', 'label']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'label'], name='unique_rollup_bucket'),
+        ]
+    
+    def __str__(self):
+        return f"{self.label} {self.period} {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
+    
+    @property
+    def avg_confidence(self):
+        if not self.confidence_count:
+            return None
+        return self.confidence_sum / self.confidence_count
+
+
+def build_detected_objects(detection_result, detections, default_confidence=None):
+    """Filas DetectedObject (sin guardar) a partir de tuplas (etiqueta, caja, confianza)"""
+    objects = []
+    for label, box, confidence in detections:
+        x, y, width, height = box if box is not None else (None, None, None, None)
+        objects.append(DetectedObject(
+            detection=detection_result,
+            label=label,
+            confidence=confidence if confidence is not None else default_confidence,
+            x=x, y=y, width=width, height=height,
+            created_at=detection_result.created_at,
+        ))
+    return objects
@@ -0,0 +1,68 @@
+import threading
+from .resources import cv2
+
+# Tamaño reducido sobre el que se comparan los frames
+MOTION_SIZE = (160, 120)
+# Diferencia mínima de gris (0-255) para considerar que un píxel cambió
+MOTION_THRESHOLD = 25
+# Fracción de píxeles cambiados a partir de la cual hay movimiento
+MOTION_MIN_CHANGED = 0.01
+# Frames seguidos sin detectar antes de forzar una pasada completa
+MOTION_MAX_SKIP = 30
+
+
+class MotionGate:
+    """Decide con diferencia de frames reducidos si vale la pena volver a detectar"""
+
+    def __init__(self, threshold=MOTION_THRESHOLD, min_changed=MOTION_MIN_CHANGED,
+                 max_skip=MOTION_MAX_SKIP, size=MOTION_SIZE):
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.max_skip = max_skip
+        self.size = size
+
+        self.reference = None
+        self.skipped_in_row = 0
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.frames_total = 0
+        self.frames_skipped = 0
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed(self, frame):
+        """True si el frame difiere lo suficiente del último que se analizó"""
+        current = self._prepare(frame)
+        with self._lock:
+            self.frames_total += 1
+
+            if self.reference is not None and self.skipped_in_row < self.max_skip:
+                diff = cv2.absdiff(current, self.reference)
+                _, moving = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+                fraction = cv2.countNonZero(moving) / moving.size
+                if fraction < self.min_changed:
+                    self.skipped_in_row += 1
+                    self.frames_skipped += 1
+                    return False
+
+            # La referencia solo avanza cuando se detecta, así el cambio lento se acumula
+            self.reference = current
+            self.skipped_in_row = 0
+            return True
+
+    def reset(self):
+        with self._lock:
+            self.reference = None
+            self.skipped_in_row = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'frames_total': self.frames_total,
+                'frames_skipped': self.frames_skipped,
+                'skip_ratio': self.frames_skipped / self.frames_total if self.frames_total else 0.0,
+            }
@@ -0,0 +1,221 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.db import transaction
+from .metrics import ERRORS, registry as metrics
+from .models import DetectionResult, build_detected_objects
+from .rollups import save_detected_objects
+
+# Registros acumulados antes de escribir en bloque
+BATCH_SIZE = 50
+# Segundos máximos entre escrituras
+FLUSH_INTERVAL = 2.0
+# Pausa máxima entre frames para seguir agrupando en el mismo evento
+EVENT_GAP = 1.0
+# Duración máxima de un evento agrupado antes de cerrarlo
+MAX_EVENT_DURATION = 60.0
+# Eventos en cola antes de empezar a descartar
+QUEUE_SIZE = 1000
+
+WRITE_SECONDS = metrics.histogram(
+    'detection_db_write_seconds', 'Duración de cada escritura en bloque de detecciones')
+EVENTS_WRITTEN = metrics.counter(
+    'detection_events_written_total', 'Eventos de detección guardados')
+EVENTS_DROPPED = metrics.counter(
+    'detection_events_dropped_total', 'Frames con detecciones descartados por la cola llena')
+
+
+class DetectionEvent:
+    """Frames consecutivos con las mismas detecciones"""
+
+    def __init__(self, detections, default_confidence, timestamp):
+        self.key = _labels_key(detections)
+        # Se conservan las cajas del último frame del evento
+        self.detections = list(detections)
+        self.default_confidence = default_confidence
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.frame_count = 1
+
+    def matches(self, detections, timestamp):
+        return (
+            _labels_key(detections) == self.key
+            and timestamp - self.last_seen <= EVENT_GAP
+            and timestamp - self.first_seen <= MAX_EVENT_DURATION
+        )
+
+    def add(self, detections, timestamp):
+        self.detections = list(detections)
+        self.last_seen = timestamp
+        self.frame_count += 1
+
+    def confidences(self):
+        return [c if c is not None else self.default_confidence for _, _, c in self.detections]
+
+    def to_model(self):
+        return DetectionResult(
+            objects_detected=json.dumps([label for label, _, _ in self.detections]),
+            confidence_scores=json.dumps(self.confidences()),
+            detection_count=len(self.detections),
+            frame_count=self.frame_count,
+            duration=self.last_seen - self.first_seen,
+            created_at=datetime.fromtimestamp(self.first_seen, tz=dt_timezone.utc),
+        )
+
+
+def _labels_key(detections):
+    return tuple(sorted(label for label, _, _ in detections))
+
+
+class EventGrouper:
+    """Agrupa frames con marca de tiempo propia (p. ej. de un video grabado) en eventos"""
+
+    def __init__(self, default_confidence=None):
+        self.default_confidence = default_confidence
+        self.current = None
+
+    def add(self, detections, timestamp):
+        """Sumar un frame; devuelve el evento anterior si con este quedó cerrado"""
+        if not detections:
+            # Como en la cámara, los frames sin objetos no se guardan
+            return None
+        if self.current is not None and self.current.matches(detections, timestamp):
+            self.current.add(detections, timestamp)
+            return None
+        closed = self.current
+        self.current = DetectionEvent(detections, self.default_confidence, timestamp)
+        return closed
+
+    def close(self):
+        """Evento abierto (o None), que queda cerrado"""
+        closed, self.current = self.current, None
+        return closed
+
+
+def write_events(events):
+    """Guardar eventos y sus objetos en bloque dentro de una transacción"""
+    with transaction.atomic():
+        results = DetectionResult.objects.bulk_create([event.to_model() for event in events])
+        objects = []
+        for event, result in zip(events, results):
+            objects.extend(build_detected_objects(result, event.detections, event.default_confidence))
+        save_detected_objects(objects)
+
+
+class DetectionWriter:
+    """Guarda detecciones del video en segundo plano y en bloque"""
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self.written = 0
+        self._flush_requested = threading.Event()
+        self._flushed = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(
+            target=self._run, name='detection-writer', daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, detections, default_confidence=None, timestamp=None):
+        """Encolar tuplas (etiqueta, caja, confianza) sin bloquear el bucle de frames"""
+        if timestamp is None:
+            timestamp = time.time()
+        try:
+            self.queue.put_nowait((detections, default_confidence, timestamp))
+        except queue.Full:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+
+    def _run(self):
+        pending = []
+        current = None
+        last_flush = time.time()
+
+        while self.running or not self.queue.empty():
+            try:
+                detections, default_confidence, timestamp = self.queue.get(timeout=0.2)
+                if current is not None and current.matches(detections, timestamp):
+                    current.add(detections, timestamp)
+                else:
+                    if current is not None:
+                        pending.append(current)
+                    current = DetectionEvent(detections, default_confidence, timestamp)
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            # Cerrar el evento abierto si la escena dejó de repetirse
+            if current is not None and now - current.last_seen > EVENT_GAP:
+                pending.append(current)
+                current = None
+
+            # Un flush espera a vaciar la cola: los frames encolados se siguen agrupando
+            flushing = self._flush_requested.is_set() and self.queue.empty()
+            if flushing and current is not None:
+                pending.append(current)
+                current = None
+
+            if pending and (len(pending) >= self.batch_size
+                            or now - last_flush >= self.flush_interval
+                            or flushing):
+                self._write(pending)
+                pending = []
+                last_flush = now
+
+            if flushing:
+                self._flush_requested.clear()
+                self._flushed.set()
+
+        if current is not None:
+            pending.append(current)
+        if pending:
+            self._write(pending)
+        self._flushed.set()
+
+    def _write(self, events):
+        try:
+            with WRITE_SECONDS.time():
+                write_events(events)
+            self.written += len(events)
+            EVENTS_WRITTEN.inc(len(events))
+        except Exception as e:
+            ERRORS.inc(stage='db')
+            print(f"Error guardando detecciones: {e}")
+
+    def flush(self, timeout=5.0):
+        """Escribir todo lo pendiente y esperar a que termine"""
+        if not self.thread.is_alive():
+            return
+        self._flushed.clear()
+        self._flush_requested.set()
+        self._flushed.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+metrics.gauge(
+    'detection_writer_queue_depth', 'Frames con detecciones esperando al escritor',
+    callback=lambda: _writer.queue.qsize() if _writer is not None else 0)
+
+
+def get_writer():
+    """Escritor único por proceso, creado al primer uso"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DetectionWriter()
+            atexit.register(_writer.stop)
+        return _writer
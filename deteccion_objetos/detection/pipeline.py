@@ -0,0 +1,538 @@
+import time
+from collections import namedtuple
+from .dnn import get_model
+from .resources import OPENCV_AVAILABLE, cv2, np
+
+if OPENCV_AVAILABLE:
+    # Umbrales HSV y kernels constantes, creados una sola vez por proceso
+    HELMET_LOWER = np.array([15, 100, 100], np.uint8)
+    HELMET_UPPER = np.array([35, 255, 255], np.uint8)
+    MASK_BLUE_LOWER = np.array([100, 50, 50], np.uint8)
+    MASK_BLUE_UPPER = np.array([130, 255, 255], np.uint8)
+    MASK_WHITE_LOWER = np.array([0, 0, 200], np.uint8)
+    MASK_WHITE_UPPER = np.array([180, 30, 255], np.uint8)
+    OPEN_KERNEL = np.ones((5,5), np.uint8)
+    CLOSE_KERNEL = np.ones((10,10), np.uint8)
+
+# Seguimiento de rostros: pasada completa cada N frames y margen de la ventana local
+TRACK_FULL_EVERY = 5
+TRACK_MARGIN = 0.5
+
+# Lado mayor (en píxeles) de la imagen de trabajo; 0 detecta a resolución nativa
+DETECTION_MAX_SIZE = 960
+
+# Presupuesto por frame: un detector que no entra se ejecuta cada 2, 4... hasta MAX_EVERY frames
+MAX_EVERY = 8
+# Frames seguidos muy por debajo del presupuesto antes de volver a ejecutar más seguido
+RELAX_AFTER = 30
+# Segundos por ejecución por debajo de los cuales un detector no se espacia: ahorra poco
+MIN_THROTTLE_COST = 0.002
+
+# Resultado de un detector: etiqueta, caja (x, y, w, h) y confianza (None en heurísticas)
+Detection = namedtuple('Detection', ['label', 'box', 'confidence'])
+
+
+class FrameContext:
+    """Frame más sus representaciones intermedias, calculadas una sola vez"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.results = {}
+        self._cache = {}
+
+    def get(self, name):
+        """Devolver la representación pedida ('gray', 'hsv' o 'edges')"""
+        if name not in self._cache:
+            self._cache[name] = REPRESENTATIONS[name](self)
+        return self._cache[name]
+
+    @property
+    def gray(self):
+        return self.get('gray')
+
+    @property
+    def hsv(self):
+        return self.get('hsv')
+
+    @property
+    def edges(self):
+        return self.get('edges')
+
+
+REPRESENTATIONS = {
+    'gray': lambda ctx: cv2.cvtColor(ctx.frame, cv2.COLOR_BGR2GRAY),
+    'hsv': lambda ctx: cv2.cvtColor(ctx.frame, cv2.COLOR_BGR2HSV),
+    'edges': lambda ctx: cv2.Canny(ctx.gray, 50, 150),
+}
+
+
+# Detectores disponibles por nombre (su label), en el orden en que se ejecutan
+DETECTORS = {}
+
+
+def register_detector(cls):
+    """Registrar una clase de detector con su label; se usa como decorador"""
+    DETECTORS[cls.label] = cls
+    return cls
+
+
+def resolve_detectors(names=None):
+    """Nombres pedidos más los detectores de los que dependen, en orden de ejecución.
+
+    Lanza ValueError si algún nombre no está registrado.
+    """
+    if names is None:
+        return [name for name, cls in DETECTORS.items() if cls.default]
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Detectores desconocidos: {', '.join(unknown)}")
+    needed = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(DETECTORS[name].depends)
+    return [name for name in DETECTORS if name in needed]
+
+
+def parse_detector_names(value):
+    """'face,helmet' (query string) o lista -> lista de nombres; vacío -> None (todos)"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    names = [name.strip() for name in value if name.strip()]
+    return names or None
+
+
+class Detector:
+    """Detector base: declara las representaciones y los detectores que necesita"""
+    label = None
+    text = None
+    color = (255, 255, 255)
+    requires = ()
+    # Detectores cuyos resultados usa (deben ejecutarse antes)
+    depends = ()
+    # False: solo se usa si se pide por nombre (p. ej. los que necesitan un modelo)
+    default = True
+    # True: detect() devuelve Detection con etiqueta y confianza propias en lugar de cajas
+    labeled = False
+
+    @classmethod
+    def create(cls, **resources):
+        """Instancia para un pipeline; resources trae face_cascade, track_every y dnn"""
+        return cls()
+
+    def detect(self, ctx):
+        """Devolver la lista de cajas (x, y, w, h) encontradas en el frame"""
+        raise NotImplementedError
+
+    def detect_batch(self, contexts):
+        """detect() de varios frames en orden; se redefine para procesarlos en una pasada"""
+        return [self.detect(ctx) for ctx in contexts]
+
+
+@register_detector
+class FaceDetector(Detector):
+    """Detectar rostros usando Haar Cascades"""
+    label = 'face'
+    text = 'Face'
+    color = (255, 0, 0)
+    requires = ('gray',)
+
+    def __init__(self, face_cascade):
+        self.face_cascade = face_cascade
+
+    @classmethod
+    def create(cls, face_cascade=None, track_every=0, **resources):
+        # Con track_every > 1 los rostros se siguen entre pasadas completas
+        if track_every > 1:
+            return TrackingFaceDetector(face_cascade, full_every=track_every)
+        return cls(face_cascade)
+
+    def detect(self, ctx):
+        if self.face_cascade is None:
+            return []
+        faces = self.face_cascade.detectMultiScale(
+            ctx.gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(30, 30)
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+
+class TrackingFaceDetector(FaceDetector):
+    """Rostros con detección completa cada N frames y búsqueda local entre medio"""
+
+    def __init__(self, face_cascade, full_every=TRACK_FULL_EVERY, margin=TRACK_MARGIN):
+        super().__init__(face_cascade)
+        self.full_every = full_every
+        self.margin = margin
+        self.previous = []
+        self.frames_since_full = 0
+        self.full_passes = 0
+        self.tracked_passes = 0
+
+    def detect(self, ctx):
+        if self.face_cascade is None:
+            return []
+
+        if not self.previous or self.frames_since_full + 1 >= self.full_every:
+            faces = super().detect(ctx)
+            self.frames_since_full = 0
+            self.full_passes += 1
+        else:
+            faces = self._track(ctx.gray)
+            self.frames_since_full += 1
+            self.tracked_passes += 1
+
+        self.previous = faces
+        return faces
+
+    def _track(self, gray):
+        """Buscar cada rostro anterior solo en una ventana a su alrededor"""
+        height, width = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in self.previous:
+            dx, dy = int(w * self.margin), int(h * self.margin)
+            x0, y0 = max(x - dx, 0), max(y - dy, 0)
+            x1, y1 = min(x + w + dx, width), min(y + h + dy, height)
+
+            # Solo escalas cercanas al tamaño anterior
+            found = self.face_cascade.detectMultiScale(
+                gray[y0:y1, x0:x1],
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(max(int(w * 0.7), 30), max(int(h * 0.7), 30)),
+                maxSize=(int(w * 1.4), int(h * 1.4))
+            )
+            for (fx, fy, fw, fh) in found:
+                face = (int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+                if not any(_overlaps(face, other) for other in faces):
+                    faces.append(face)
+        return faces
+
+
+def _rescale(box, factor):
+    """Escalar una caja (x, y, w, h) por factor"""
+    return tuple(int(round(v * factor)) for v in box)
+
+
+def _overlaps(a, b):
+    """True si el centro de una caja cae dentro de la otra"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    cx, cy = ax + aw / 2, ay + ah / 2
+    return bx <= cx <= bx + bw and by <= cy <= by + bh
+
+
+@register_detector
+class HelmetDetector(Detector):
+    """Detectar cascos basado en color amarillo/naranja"""
+    label = 'helmet'
+    text = 'Helmet'
+    color = (0, 255, 255)
+    requires = ('hsv',)
+
+    def detect(self, ctx):
+        # Rango de colores para cascos (amarillo/naranja)
+        mask = cv2.inRange(ctx.hsv, HELMET_LOWER, HELMET_UPPER)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, OPEN_KERNEL)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, CLOSE_KERNEL)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        helmets = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area > 1000:  # Filtrar por área mínima
+                x, y, w, h = cv2.boundingRect(contour)
+                # Verificar proporciones típicas de un casco
+                if 0.7 <= w/h <= 1.5 and y < ctx.frame.shape[0] * 0.6:  # En la parte superior
+                    helmets.append((x, y, w, h))
+
+        return helmets
+
+
+@register_detector
+class PhoneDetector(Detector):
+    """Detectar teléfonos basado en forma rectangular"""
+    label = 'phone'
+    text = 'Phone'
+    color = (255, 255, 0)
+    requires = ('edges',)
+
+    def detect(self, ctx):
+        contours, _ = cv2.findContours(ctx.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        phones = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if 500 < area < 5000:  # Área típica de un teléfono
+                x, y, w, h = cv2.boundingRect(contour)
+                aspect_ratio = w / h
+                # Verificar proporciones típicas de un teléfono (vertical u horizontal)
+                if (0.4 <= aspect_ratio <= 0.8) or (1.2 <= aspect_ratio <= 2.5):
+                    phones.append((x, y, w, h))
+
+        return phones
+
+
+@register_detector
+class MaskDetector(Detector):
+    """Detectar mascarillas en la región facial inferior"""
+    label = 'mask'
+    text = 'Mask'
+    color = (0, 255, 0)
+    requires = ('hsv',)
+    depends = ('face',)
+
+    def detect(self, ctx):
+        masks = []
+
+        for (fx, fy, fw, fh) in ctx.results.get('face', []):
+            # Región inferior del rostro donde estaría la mascarilla
+            mask_y = fy + int(fh * 0.5)
+            mask_h = int(fh * 0.4)
+
+            if mask_y + mask_h < ctx.frame.shape[0]:
+                # La conversión HSV es por píxel: basta con recortar la del frame completo
+                hsv_roi = ctx.hsv[mask_y:mask_y+mask_h, fx:fx+fw]
+
+                # Máscara para colores típicos de mascarillas (azul, blanco)
+                mask_blue = cv2.inRange(hsv_roi, MASK_BLUE_LOWER, MASK_BLUE_UPPER)
+                mask_white = cv2.inRange(hsv_roi, MASK_WHITE_LOWER, MASK_WHITE_UPPER)
+
+                combined_mask = cv2.bitwise_or(mask_blue, mask_white)
+
+                # Si hay suficientes píxeles de color de mascarilla
+                if np.sum(combined_mask) > hsv_roi.shape[0] * hsv_roi.shape[1] * 0.3:
+                    masks.append((fx, mask_y, fw, mask_h))
+
+        return masks
+
+
+@register_detector
+class DnnDetector(Detector):
+    """Objetos de una red neuronal local (settings.DETECTION_DNN) con cv2.dnn; solo si se pide"""
+    label = 'dnn'
+    text = 'DNN'
+    color = (255, 0, 255)
+    default = False
+    labeled = True
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def create(cls, dnn=None, **resources):
+        if not dnn:
+            raise ValueError("El detector dnn necesita settings.DETECTION_DNN")
+        return cls(get_model(dnn))
+
+    def detect(self, ctx):
+        return self.detect_batch([ctx])[0]
+
+    def detect_batch(self, contexts):
+        # Todos los frames en una pasada de la red (en lotes de batch_size)
+        results = self.model.detect([ctx.frame for ctx in contexts])
+        return [[Detection(*found) for found in detections] for detections in results]
+
+
+class DetectorBudget:
+    """Reparte un presupuesto de segundos por frame entre los detectores.
+
+    Si el costo esperado por frame lo supera, el detector que más aporta pasa a
+    ejecutarse cada 2, 4... frames (entre medio se reutilizan sus cajas); cuando
+    sobra tiempo durante un rato, vuelve a ejecutarse más seguido. Los detectores
+    que cuestan menos de min_cost no se espacian; si el presupuesto no se alcanza,
+    los demás se espacian igual hasta max_every (lo más cerca posible).
+    """
+
+    def __init__(self, budget, max_every=MAX_EVERY, relax_after=RELAX_AFTER, min_cost=MIN_THROTTLE_COST):
+        self.budget = budget
+        self.max_every = max_every
+        self.relax_after = relax_after
+        self.min_cost = min_cost
+        # Promedio móvil de segundos por ejecución y cada cuántos frames corre cada detector
+        self.cost = {}
+        self.every = {}
+        self.calm_frames = 0
+
+    def should_run(self, label, frame_index):
+        return frame_index % self.every.get(label, 1) == 0
+
+    def record(self, label, seconds):
+        previous = self.cost.get(label)
+        self.cost[label] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    def expected(self):
+        """Segundos por frame esperados con los intervalos actuales"""
+        return sum(cost / self.every.get(label, 1) for label, cost in self.cost.items())
+
+    def adjust(self):
+        expected = self.expected()
+        if expected > self.budget:
+            self.calm_frames = 0
+            candidates = [
+                label for label, cost in self.cost.items()
+                if self.every.get(label, 1) < self.max_every and cost >= self.min_cost
+            ]
+            if candidates:
+                label = max(candidates, key=lambda l: self.cost[l] / self.every.get(l, 1))
+                self.every[label] = self.every.get(label, 1) * 2
+        elif expected < self.budget / 2:
+            self.calm_frames += 1
+            if self.calm_frames >= self.relax_after:
+                self.calm_frames = 0
+                throttled = [label for label, every in self.every.items() if every > 1]
+                if throttled:
+                    # Primero el más barato: es el que menos arriesga volver a pasarse
+                    label = min(throttled, key=lambda l: self.cost.get(l, 0))
+                    every = self.every[label]
+                    if expected + self.cost.get(label, 0) / every <= self.budget * 0.8:
+                        self.every[label] = every // 2
+        else:
+            self.calm_frames = 0
+
+
+class DetectionPipeline:
+    """Ejecuta los detectores sobre un frame compartiendo gris/HSV/bordes"""
+
+    def __init__(self, face_cascade=None, detectors=None, track_every=0,
+                 max_size=DETECTION_MAX_SIZE, names=None, budget=None, dnn=None):
+        """names: detectores registrados a usar (None: los de uso por defecto);
+        budget: segundos por frame o None; dnn: configuración del detector dnn
+        """
+        # Solo se informan los detectores pedidos; los que necesitan (p. ej. rostros
+        # para mascarillas) se ejecutan igual
+        self.outputs = set(names) if names is not None else None
+        if detectors is None:
+            detectors = [
+                DETECTORS[name].create(face_cascade=face_cascade, track_every=track_every, dnn=dnn)
+                for name in resolve_detectors(names)
+            ]
+        self.detectors = detectors
+        self.max_size = max_size
+        self.budget = DetectorBudget(budget) if budget else None
+        self.frame_index = 0
+        # Detecciones de la última ejecución de cada detector, para los frames en que se salta
+        self.last_found = {}
+        self.last_shape = None
+        # Segundos de cada etapa de la última llamada a run() (resize, representaciones, detectores)
+        self.last_timings = {}
+
+    def working_scale(self, frame):
+        """Factor para llevar el frame a la resolución de trabajo (1.0 si ya cabe)"""
+        longest = max(frame.shape[:2])
+        if not self.max_size or longest <= self.max_size:
+            return 1.0
+        return self.max_size / longest
+
+    def representations_for(self, detectors):
+        """Representaciones intermedias que piden esos detectores, sin repetir"""
+        names = []
+        for detector in detectors:
+            for name in detector.requires:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    @property
+    def representations(self):
+        return self.representations_for(self.detectors)
+
+    def _scheduled(self, frame):
+        """Detectores que se ejecutan en este frame según el presupuesto"""
+        if self.budget is None:
+            return self.detectors
+        if frame.shape != self.last_shape:
+            # Las cajas guardadas son de otra resolución de trabajo
+            self.last_found = {}
+            self.last_shape = frame.shape
+        return [
+            detector for detector in self.detectors
+            if detector.label not in self.last_found
+            or self.budget.should_run(detector.label, self.frame_index)
+        ]
+
+    def run(self, frame):
+        """Detectar objetos en el frame sin modificarlo; las cajas quedan en sus coordenadas"""
+        return self.run_batch([frame])[0]
+
+    def run_batch(self, frames):
+        """run() de varios frames en orden; cada detector los procesa juntos (la red dnn en una pasada).
+
+        last_timings queda en segundos por frame.
+        """
+        if self.budget is not None and len(frames) > 1:
+            # El presupuesto se reparte frame a frame
+            return [self.run(frame) for frame in frames]
+
+        timings = {}
+        contexts = []
+        scales = []
+        for frame in frames:
+            # Reducir una sola vez; todos los detectores trabajan sobre la copia pequeña
+            scale = self.working_scale(frame)
+            if scale != 1.0:
+                start = time.perf_counter()
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                timings['resize'] = timings.get('resize', 0) + time.perf_counter() - start
+            contexts.append(FrameContext(frame))
+            scales.append(scale)
+
+        self.frame_index += 1
+        scheduled = self._scheduled(contexts[0].frame)
+        # Calcular una sola vez lo que piden los detectores de este frame y compartirlo
+        for name in self.representations_for(scheduled):
+            start = time.perf_counter()
+            for ctx in contexts:
+                ctx.get(name)
+            timings[name] = time.perf_counter() - start
+        detections = [[] for _ in frames]
+        for detector in self.detectors:
+            label = detector.label
+            if detector in scheduled:
+                start = time.perf_counter()
+                results = detector.detect_batch(contexts)
+                timings[label] = time.perf_counter() - start
+                if not detector.labeled:
+                    results = [[Detection(label, box, None) for box in boxes] for boxes in results]
+                if self.budget is not None:
+                    self.budget.record(label, timings[label])
+                    self.last_found[label] = results[0]
+            else:
+                # Saltado por presupuesto: se reutilizan sus últimas detecciones
+                results = [self.last_found[label]]
+            for ctx, found in zip(contexts, results):
+                ctx.results[label] = [d.box for d in found]
+            if self.outputs is None or label in self.outputs:
+                for frame_detections, found in zip(detections, results):
+                    frame_detections.extend(found)
+        if self.budget is not None:
+            self.budget.adjust()
+        self.last_timings = {stage: seconds / len(frames) for stage, seconds in timings.items()}
+
+        return [
+            [d._replace(box=_rescale(d.box, 1.0 / scale)) for d in found] if scale != 1.0 else found
+            for found, scale in zip(detections, scales)
+        ]
+
+    def draw(self, frame, detections):
+        """Dibujar las cajas y etiquetas de las detecciones sobre el frame"""
+        styles = {d.label: (d.text, d.color) for d in self.detectors}
+        for detection in detections:
+            text, color = styles.get(detection.label, (detection.label, (255, 255, 255)))
+            x, y, w, h = detection.box
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        return frame
+
+    def process(self, frame):
+        """Detectar y dibujar; devuelve las detecciones"""
+        detections = self.run(frame)
+        self.draw(frame, detections)
+        return detections
@@ -0,0 +1,201 @@
+import threading
+from django.conf import settings
+from .broadcast import IDLE_TIMEOUT, FrameBroadcaster
+from .camera import CAPTURE_HEIGHT, CAPTURE_WIDTH, VideoCamera
+from .metrics import registry as metrics
+from .dnn import get_model
+from .pipeline import TRACK_FULL_EVERY, parse_detector_names, resolve_detectors
+
+# Cámara que usan /video_feed/ y /detect/ cuando no se indica otra
+DEFAULT_CAMERA = 'default'
+# Espectadores simultáneos por cámara, salvo que se configure otro límite
+MAX_VIEWERS = 100
+# Cámaras abiertas a la vez en el proceso
+MAX_ACTIVE_CAMERAS = 8
+
+# Valores de cada entrada de settings.DETECTION_CAMERAS
+CAMERA_DEFAULTS = {
+    'source': None,
+    'width': CAPTURE_WIDTH,
+    'height': CAPTURE_HEIGHT,
+    'max_fps': None,
+    'max_viewers': MAX_VIEWERS,
+    'idle_timeout': IDLE_TIMEOUT,
+    # None: usar settings.DETECTION_WORKER_PROCESSES
+    'worker_process': None,
+    # Nombres de detectores (None: los de uso por defecto; 'dnn' usa settings.DETECTION_DNN)
+    'detectors': None,
+    # Segundos por frame para detectar; None: usar settings.DETECTION_BUDGET
+    'detection_budget': None,
+    # True, False o {'threshold', 'min_changed', 'max_skip'}; None: usar settings.DETECTION_MOTION_GATE
+    'motion_gate': None,
+    # Buscar rostros en todo el frame cada N frames (0 o 1: siempre); None: usar settings.DETECTION_TRACK_EVERY
+    'track_every': None,
+}
+
+
+class UnknownCamera(Exception):
+    pass
+
+
+class CameraUnavailable(Exception):
+    """Se alcanzó el límite de espectadores de la cámara o de cámaras abiertas"""
+
+
+def camera_config(value):
+    """Normalizar una entrada de DETECTION_CAMERAS (dict, índice, URI o ruta)"""
+    if not isinstance(value, dict):
+        value = {'source': value}
+    config = {**CAMERA_DEFAULTS, **value}
+    source = config['source']
+    if isinstance(source, str) and source.isdigit():
+        config['source'] = int(source)
+    config['detectors'] = parse_detector_names(config['detectors'])
+    return config
+
+
+class CameraRegistry:
+    """Cámaras configuradas, abiertas con el primer espectador y cerradas tras quedar sin ellos"""
+
+    def __init__(self, cameras=None, max_active=None):
+        # None: leer settings.DETECTION_CAMERAS / DETECTION_MAX_ACTIVE_CAMERAS
+        self._cameras = cameras
+        self._max_active = max_active
+        self._broadcasters = {}
+        self._open_locks = {}
+        self._lock = threading.Lock()
+
+    def configs(self):
+        cameras = self._cameras
+        if cameras is None:
+            cameras = getattr(settings, 'DETECTION_CAMERAS', {DEFAULT_CAMERA: None})
+        return {camera_id: camera_config(value) for camera_id, value in cameras.items()}
+
+    def config(self, camera_id):
+        try:
+            return self.configs()[camera_id]
+        except KeyError:
+            raise UnknownCamera(camera_id)
+
+    @property
+    def max_active(self):
+        if self._max_active is not None:
+            return self._max_active
+        return getattr(settings, 'DETECTION_MAX_ACTIVE_CAMERAS', MAX_ACTIVE_CAMERAS)
+
+    def _worker_process(self, config):
+        if config['worker_process'] is not None:
+            return config['worker_process']
+        return getattr(settings, 'DETECTION_WORKER_PROCESSES', True)
+
+    def _detection_budget(self, config):
+        if config['detection_budget'] is not None:
+            return config['detection_budget']
+        return getattr(settings, 'DETECTION_BUDGET', None)
+
+    def _motion_gate(self, config):
+        if config['motion_gate'] is not None:
+            return config['motion_gate']
+        return getattr(settings, 'DETECTION_MOTION_GATE', True)
+
+    def _track_every(self, config):
+        if config['track_every'] is not None:
+            return config['track_every']
+        return getattr(settings, 'DETECTION_TRACK_EVERY', TRACK_FULL_EVERY)
+
+    def _open_lock(self, camera_id):
+        with self._lock:
+            return self._open_locks.setdefault(camera_id, threading.Lock())
+
+    def get(self, camera_id=DEFAULT_CAMERA):
+        """Difusor de la cámara, abriéndola si hace falta.
+
+        Reserva el lugar de un espectador: el llamador debe suscribirse enseguida.
+        """
+        config = self.config(camera_id)
+        # Abrir una cámara (p. ej. RTSP) puede tardar: solo se bloquea a quien pide la misma
+        with self._open_lock(camera_id):
+            with self._lock:
+                broadcaster = self._broadcasters.get(camera_id)
+                if broadcaster is None and len(self._broadcasters) >= self.max_active:
+                    raise CameraUnavailable(f"Máximo de {self.max_active} cámaras abiertas")
+
+            if broadcaster is None:
+                # Detectores mal configurados o modelo ausente: fallar antes de abrir la cámara
+                dnn = getattr(settings, 'DETECTION_DNN', None)
+                if 'dnn' in resolve_detectors(config['detectors']):
+                    if not dnn:
+                        raise ValueError("El detector dnn necesita settings.DETECTION_DNN")
+                    get_model(dnn)
+                camera = VideoCamera(
+                    source=config['source'],
+                    width=config['width'],
+                    height=config['height'],
+                    max_fps=config['max_fps'],
+                    worker_process=self._worker_process(config),
+                    name=camera_id,
+                    detectors=config['detectors'],
+                    detection_budget=self._detection_budget(config),
+                    dnn=dnn,
+                    motion_gate=self._motion_gate(config),
+                    track_every=self._track_every(config),
+                )
+                broadcaster = FrameBroadcaster(
+                    camera, idle_timeout=config['idle_timeout'], on_idle=self._on_idle
+                )
+                broadcaster.camera_id = camera_id
+                with self._lock:
+                    self._broadcasters[camera_id] = broadcaster
+
+            if not broadcaster.reserve(config['max_viewers']):
+                raise CameraUnavailable(f"Máximo de {config['max_viewers']} espectadores para {camera_id}")
+            return broadcaster
+
+    def peek(self, camera_id=DEFAULT_CAMERA):
+        """Difusor de la cámara si está abierta, sin abrirla"""
+        with self._lock:
+            return self._broadcasters.get(camera_id)
+
+    def active(self):
+        with self._lock:
+            return dict(self._broadcasters)
+
+    def _on_idle(self, broadcaster):
+        """El difusor se quedó sin espectadores: liberar la cámara"""
+        camera_id = broadcaster.camera_id
+        with self._open_lock(camera_id):
+            if not broadcaster.close_if_idle():
+                # Llegó un espectador mientras tanto
+                return
+            with self._lock:
+                if self._broadcasters.get(camera_id) is broadcaster:
+                    del self._broadcasters[camera_id]
+        broadcaster.camera.release()
+
+    def stop_all(self):
+        with self._lock:
+            broadcasters = list(self._broadcasters.values())
+            self._broadcasters.clear()
+        for broadcaster in broadcasters:
+            broadcaster.closed = True
+            broadcaster.stop()
+            broadcaster.camera.release()
+
+
+camera_registry = CameraRegistry()
+
+
+# Estado de las cámaras abiertas, leído al exponer las métricas
+metrics.gauge(
+    'detection_active_cameras', 'Cámaras abiertas',
+    callback=lambda: len(camera_registry.active()))
+metrics.gauge(
+    'detection_viewers', 'Espectadores suscritos por cámara', ('camera',),
+    callback=lambda: {(camera_id,): b.subscribers for camera_id, b in camera_registry.active().items()})
+metrics.gauge(
+    'detection_frame_buffer_depth', 'Frames capturados esperando en el buffer de la cámara', ('camera',),
+    callback=lambda: {(camera_id,): len(b.camera.frames) for camera_id, b in camera_registry.active().items()})
+metrics.gauge(
+    'detection_worker_process', 'Si la cámara detecta en un proceso propio (1) o en el del servidor (0)', ('camera',),
+    callback=lambda: {(camera_id,): int(b.camera.detector is not None)
+                      for camera_id, b in camera_registry.active().items()})
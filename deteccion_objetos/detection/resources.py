@@ -0,0 +1,94 @@
+import threading
+from contextlib import contextmanager
+
+# Intentar importar OpenCV y numpy; los demás módulos los importan de aquí
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+    cv2 = None
+    np = None
+
+FACE_CASCADE = 'haarcascade_frontalface_default.xml'
+
+
+class ClassifierPool:
+    """Clasificadores Haar reutilizables de un mismo archivo XML.
+
+    CascadeClassifier no es reentrante, así que cada hilo toma una instancia
+    en exclusiva y la devuelve al terminar; el XML solo se parsea cuando no
+    queda ninguna instancia libre.
+    """
+
+    def __init__(self, filename):
+        self.path = cv2.data.haarcascades + filename
+        self._free = []
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _load(self):
+        cascade = cv2.CascadeClassifier(self.path)
+        if cascade.empty():
+            raise Exception(f"No se pudo cargar el clasificador {self.path}")
+        with self._lock:
+            self.created += 1
+        return cascade
+
+    def acquire(self):
+        """Tomar una instancia libre o cargar una nueva"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return self._load()
+
+    def release(self, cascade):
+        """Devolver una instancia al pool"""
+        if cascade is None:
+            return
+        with self._lock:
+            self._free.append(cascade)
+
+    @contextmanager
+    def borrow(self):
+        cascade = self.acquire()
+        try:
+            yield cascade
+        finally:
+            self.release(cascade)
+
+    def warm_up(self, count=1):
+        """Dejar al menos count instancias ya cargadas"""
+        with self._lock:
+            missing = count - len(self._free)
+        for _ in range(missing):
+            self.release(self._load())
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(filename=FACE_CASCADE):
+    """Pool único por proceso para el archivo indicado"""
+    with _pools_lock:
+        pool = _pools.get(filename)
+        if pool is None:
+            pool = _pools[filename] = ClassifierPool(filename)
+        return pool
+
+
+def face_cascade():
+    """Context manager con un clasificador de rostros prestado"""
+    return get_pool(FACE_CASCADE).borrow()
+
+
+def warm_up():
+    """Precargar los clasificadores al iniciar el proceso"""
+    if not OPENCV_AVAILABLE:
+        return
+    try:
+        get_pool(FACE_CASCADE).warm_up()
+    except Exception as e:
+        print(f"Error precargando clasificadores: {e}")
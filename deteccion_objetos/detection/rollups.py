@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import Greatest, TruncHour, TruncMinute
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from .models import DetectedObject, DetectionResult, DetectionRollup
+
+# Resúmenes por minuto y por hora que se actualizan al guardar cada detección,
+# para que las estadísticas no tengan que recorrer la tabla de objetos
+
+PERIODS = {
+    'minute': TruncMinute,
+    'hour': TruncHour,
+}
+
+
+def truncate(moment, period):
+    """Inicio del minuto u hora (en UTC) al que pertenece una fecha"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(dt_timezone.utc)
+    moment = moment.replace(second=0, microsecond=0)
+    if period == 'hour':
+        moment = moment.replace(minute=0)
+    return moment
+
+
+def save_detected_objects(objects):
+    """Guardar filas DetectedObject y sumarlas a los resúmenes en la misma transacción"""
+    with transaction.atomic():
+        DetectedObject.objects.bulk_create(objects)
+        add_to_rollups(objects)
+
+
+def add_to_rollups(objects):
+    """Sumar objetos (guardados o no) a los contadores por minuto y por hora"""
+    for (period, bucket, label), totals in _group(objects).items():
+        _increment(period, bucket, label, *totals)
+
+
+def remove_from_rollups(objects):
+    """Descontar objetos borrados de los contadores (lista o queryset de DetectedObject)"""
+    if isinstance(objects, QuerySet):
+        # Agrupar en la base de datos sin cargar las filas
+        for period, trunc in PERIODS.items():
+            for row in _bucket_rows(objects, trunc):
+                _decrement(period, **row)
+        return
+    for (period, bucket, label), totals in _group(objects).items():
+        _decrement(period, bucket, label, *totals)
+
+
+def _group(objects):
+    """Cantidad, suma y número de confianzas por (periodo, intervalo, etiqueta)"""
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for obj in objects:
+        for period in PERIODS:
+            entry = totals[(period, truncate(obj.created_at, period), obj.label)]
+            entry[0] += 1
+            if obj.confidence is not None:
+                entry[1] += obj.confidence
+                entry[2] += 1
+    return totals
+
+
+def _bucket_rows(objects, trunc):
+    return (
+        objects
+        .order_by()
+        .annotate(bucket=trunc('created_at', tzinfo=dt_timezone.utc))
+        .values('bucket', 'label')
+        .annotate(
+            count=Count('id'),
+            confidence_sum=Sum('confidence', default=0.0),
+            confidence_count=Count('confidence'),
+        )
+    )
+
+
+def _increment(period, bucket, label, count, confidence_sum, confidence_count):
+    fields = {
+        'count': F('count') + count,
+        'confidence_sum': F('confidence_sum') + confidence_sum,
+        'confidence_count': F('confidence_count') + confidence_count,
+    }
+    rollups = DetectionRollup.objects.filter(period=period, bucket=bucket, label=label)
+    if rollups.update(**fields):
+        return
+    try:
+        with transaction.atomic():
+            DetectionRollup.objects.create(
+                period=period, bucket=bucket, label=label, count=count,
+                confidence_sum=confidence_sum, confidence_count=confidence_count,
+            )
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        rollups.update(**fields)
+
+
+def _decrement(period, bucket, label, count, confidence_sum, confidence_count):
+    rollups = DetectionRollup.objects.filter(period=period, bucket=bucket, label=label)
+    rollups.update(
+        count=Greatest(F('count') - count, 0),
+        confidence_sum=F('confidence_sum') - confidence_sum,
+        confidence_count=Greatest(F('confidence_count') - confidence_count, 0),
+    )
+    # Un intervalo sin objetos no aparece en las estadísticas
+    rollups.filter(count=0).delete()
+
+
+@receiver(pre_delete, sender=DetectionResult)
+def remove_result_from_rollups(sender, instance, **kwargs):
+    """Descontar de una vez los objetos de una detección antes de que se borren en cascada"""
+    remove_from_rollups(instance.detected_objects.all())
+
+
+@receiver(post_delete, sender=DetectedObject)
+def remove_object_from_rollups(sender, instance, origin=None, **kwargs):
+    # Los borrados en cascada ya se descontaron agrupados en pre_delete
+    if isinstance(origin, DetectionResult) or (
+            isinstance(origin, QuerySet) and origin.model is DetectionResult):
+        return
+    remove_from_rollups([instance])
+
+
+def rebuild_rollups():
+    """Recalcular todos los resúmenes desde DetectedObject (p. ej. si quedaron desfasados)"""
+    with transaction.atomic():
+        DetectionRollup.objects.all().delete()
+        for period, trunc in PERIODS.items():
+            rows = _bucket_rows(DetectedObject.objects, trunc)
+            DetectionRollup.objects.bulk_create(
+                (DetectionRollup(period=period, **row) for row in rows.iterator()),
+                batch_size=1000,
+            )
+
+
+def rollup_series(period='hour', since=None, until=None, label=None):
+    """Filas de resumen de un intervalo, ordenadas por fecha"""
+    rollups = DetectionRollup.objects.filter(period=period)
+    if since is not None:
+        rollups = rollups.filter(bucket__gte=truncate(since, period))
+    if until is not None:
+        rollups = rollups.filter(bucket__lt=until)
+    if label is not None:
+        rollups = rollups.filter(label=label)
+    return rollups.order_by('bucket', 'label')
+
+
+def rollup_totals(rollups):
+    """Total y confianza promedio por etiqueta de un conjunto de resúmenes"""
+    rows = (
+        rollups
+        .order_by()
+        .values('label')
+        .annotate(
+            total=Sum('count'),
+            confidence_sum=Sum('confidence_sum'),
+            confidence_count=Sum('confidence_count'),
+        )
+        .order_by('-total', 'label')
+    )
+    return [
+        {
+            'label': row['label'],
+            'count': row['total'],
+            'avg_confidence': (row['confidence_sum'] / row['confidence_count']
+                               if row['confidence_count'] else None),
+        }
+        for row in rows
+    ]
@@ -1,3 +1,703 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+from datetime import datetime, timezone as dt_timezone
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from .batch import MAX_BATCH_FILES
+from .cache import upload_cache
+from .camera import DetectionSnapshot, VideoCamera
+from .dnn import DnnModel
+from .models import DetectedObject, DetectionResult, DetectionRollup, build_detected_objects
+from .motion import MotionGate
+from .persistence import DetectionWriter
+from .pipeline import TRACK_FULL_EVERY, Detection, DetectorBudget, TrackingFaceDetector
+from .registry import CameraRegistry, CameraUnavailable
+from .rollups import rebuild_rollups, save_detected_objects, truncate
 
-# Create your tests here.
+
+class DetectionWriterTests(TestCase):
+    def test_flush_coalesces_queued_frames(self):
+        """flush() con muchos frames en cola escribe un registro por evento, no uno por frame"""
+        writer = DetectionWriter()
+        # Detener el hilo para encolar todo y procesarlo aquí, en la conexión del test
+        writer.stop()
+        base = time.time() + 60
+        for i in range(50):
+            writer.submit([('face', (0, 0, 10, 10), 0.9)], timestamp=base + i * 0.1)
+        # Pausa mayor que EVENT_GAP: empieza otro evento
+        for i in range(45):
+            writer.submit([('face', (0, 0, 10, 10), 0.9), ('phone', (5, 5, 4, 8), None)],
+                          default_confidence=0.6, timestamp=base + 10 + i * 0.1)
+        writer._flush_requested.set()
+        writer._run()
+
+        results = list(DetectionResult.objects.order_by('created_at'))
+        self.assertEqual(len(results), 2)
+        self.assertEqual([r.frame_count for r in results], [50, 45])
+        self.assertEqual(json.loads(results[1].objects_detected), ['face', 'phone'])
+        self.assertEqual(json.loads(results[1].confidence_scores), [0.9, 0.6])
+        self.assertEqual(DetectedObject.objects.count(), 3)
+        self.assertEqual(writer.written, 2)
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return SimpleUploadedFile('lote.zip', buffer.getvalue(), 'application/zip')
+
+
+class UploadBatchLimitTests(TestCase):
+    def test_zip_with_too_many_images_is_rejected(self):
+        archive = make_zip([(f'{i}.jpg', b'x') for i in range(MAX_BATCH_FILES + 1)])
+        response = self.client.post('/upload/batch/', {'archive': archive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(MAX_BATCH_FILES), response.json()['error'])
+
+    @override_settings(DETECTION_MAX_UPLOAD_SIZE=1024)
+    def test_oversized_zip_member_is_rejected(self):
+        # 1 MB de ceros se comprime a unos pocos KB
+        archive = make_zip([('ok.jpg', b'x'), ('grande.jpg', bytes(1024 * 1024))])
+        response = self.client.post('/upload/batch/', {'archive': archive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('grande.jpg', response.json()['error'])
+
+    @override_settings(DETECTION_MAX_BATCH_SIZE=64 * 1024)
+    def test_batch_total_size_is_limited(self):
+        # Cada miembro entra en el límite por imagen, pero juntos superan el del lote
+        archive = make_zip([(f'{i}.jpg', bytes(16 * 1024)) for i in range(5)])
+        response = self.client.post('/upload/batch/', {'archive': archive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('máximo', response.json()['error'])
+
+    @override_settings(DATA_UPLOAD_MAX_NUMBER_FILES=3)
+    def test_too_many_multipart_files_answers_json(self):
+        images = [SimpleUploadedFile(f'{i}.jpg', b'x', 'image/jpeg') for i in range(4)]
+        response = self.client.post('/upload/batch/', {'images': images})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_invalid_zip_is_rejected(self):
+        archive = SimpleUploadedFile('lote.zip', b'no es un zip', 'application/zip')
+        response = self.client.post('/upload/batch/', {'archive': archive})
+        self.assertEqual(response.status_code, 400)
+
+
+def snapshot_only_camera():
+    """VideoCamera sin captura, solo con el estado de las detecciones publicadas"""
+    camera = VideoCamera.__new__(VideoCamera)
+    camera.running = True
+    camera.snapshot = DetectionSnapshot(0, 0, None, [])
+    camera.snapshot_condition = threading.Condition()
+    camera.snapshot_waiters = set()
+    return camera
+
+
+class WaitDetectionsAsyncTests(TestCase):
+    def test_wakes_up_when_another_thread_publishes(self):
+        camera = snapshot_only_camera()
+        detections = [Detection('face', (1, 2, 3, 4), None)]
+
+        async def wait():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, lambda: threading.Thread(
+                target=camera._publish_detections, args=(detections, 1, time.time())).start())
+            started = time.monotonic()
+            snapshot = await camera.wait_detections_async(0, timeout=5)
+            return snapshot, time.monotonic() - started
+
+        snapshot, elapsed = asyncio.run(wait())
+        self.assertEqual(snapshot.seq, 1)
+        self.assertEqual(snapshot.detections, detections)
+        self.assertLess(elapsed, 1)
+        self.assertFalse(camera.snapshot_waiters)
+
+    def test_times_out_without_changes(self):
+        camera = snapshot_only_camera()
+        snapshot = asyncio.run(camera.wait_detections_async(0, timeout=0.05))
+        self.assertEqual(snapshot.seq, 0)
+        self.assertFalse(camera.snapshot_waiters)
+
+
+class FakeCamera:
+    """Cámara sin captura: entrega un frame negro cada 10 ms"""
+    opened = []
+
+    def __init__(self, name='default', **kwargs):
+        self.name = name
+        self.kwargs = kwargs
+        self.released = False
+        FakeCamera.opened.append(self)
+
+    def get_image(self):
+        time.sleep(0.01)
+        return np.zeros((8, 8, 3), dtype=np.uint8)
+
+    def release(self):
+        self.released = True
+
+
+class CameraRegistryTests(TestCase):
+    def setUp(self):
+        FakeCamera.opened = []
+        patcher = mock.patch('detection.registry.VideoCamera', FakeCamera)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def registry(self, cameras, max_active=None):
+        registry = CameraRegistry(cameras, max_active=max_active)
+        self.addCleanup(registry.stop_all)
+        return registry
+
+    def test_camera_opens_with_first_viewer(self):
+        registry = self.registry({'a': 0})
+        self.assertIsNone(registry.peek('a'))
+        broadcaster = registry.get('a')
+        self.assertIs(registry.peek('a'), broadcaster)
+        self.assertIs(registry.get('a'), broadcaster)
+        self.assertEqual([camera.name for camera in FakeCamera.opened], ['a'])
+        self.assertEqual(FakeCamera.opened[0].kwargs['track_every'], TRACK_FULL_EVERY)
+
+    def test_track_every_per_camera(self):
+        registry = self.registry({'a': {'source': 0, 'track_every': 0}})
+        registry.get('a')
+        self.assertEqual(FakeCamera.opened[0].kwargs['track_every'], 0)
+
+    def test_camera_closes_after_idle_timeout(self):
+        registry = self.registry({'a': {'source': 0, 'idle_timeout': 0.1}})
+        frames = registry.get('a').subscribe()
+        next(frames)
+        frames.close()
+        deadline = time.monotonic() + 5
+        while registry.peek('a') is not None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertIsNone(registry.peek('a'))
+        self.assertTrue(FakeCamera.opened[0].released)
+
+        # El siguiente espectador vuelve a abrirla
+        registry.get('a')
+        self.assertEqual(len(FakeCamera.opened), 2)
+
+    def test_max_active_cameras(self):
+        registry = self.registry({'a': 0, 'b': 1}, max_active=1)
+        registry.get('a')
+        with self.assertRaises(CameraUnavailable):
+            registry.get('b')
+        self.assertIsNone(registry.peek('b'))
+
+    def test_max_viewers_counts_viewers_not_yet_subscribed(self):
+        registry = self.registry({'a': {'source': 0, 'max_viewers': 2}})
+        broadcaster = registry.get('a')
+        registry.get('a')
+        # Ninguno empezó el stream todavía: el tercero ya no entra
+        with self.assertRaises(CameraUnavailable):
+            registry.get('a')
+
+        frames = broadcaster.subscribe()
+        next(frames)
+        self.assertEqual(broadcaster.subscribers, 1)
+        with self.assertRaises(CameraUnavailable):
+            registry.get('a')
+
+        frames.close()
+        registry.get('a')
+
+
+def gray_frame(value):
+    return np.full((120, 160, 3), value, dtype=np.uint8)
+
+
+class MotionGateTests(TestCase):
+    def test_static_scene_is_skipped(self):
+        gate = MotionGate()
+        frame = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        self.assertEqual([gate.changed(frame) for _ in range(4)], [True, False, False, False])
+        self.assertEqual(gate.stats()['frames_skipped'], 3)
+
+        moved = frame.copy()
+        moved[:60] = 255 - moved[:60]
+        self.assertTrue(gate.changed(moved))
+
+    def test_max_skip_forces_a_pass(self):
+        gate = MotionGate(max_skip=3)
+        frame = gray_frame(100)
+        self.assertEqual([gate.changed(frame) for _ in range(9)],
+                         [True, False, False, False, True, False, False, False, True])
+
+    def test_slow_drift_builds_up_against_the_reference(self):
+        gate = MotionGate(threshold=25, max_skip=100)
+        # Cada frame cambia 5 niveles de gris: solo se detecta cuando la suma supera el umbral
+        results = [gate.changed(gray_frame(100 + 5 * i)) for i in range(13)]
+        self.assertEqual([i for i, changed in enumerate(results) if changed], [0, 6, 12])
+
+    def test_reset_forces_a_pass(self):
+        gate = MotionGate()
+        frame = gray_frame(100)
+        gate.changed(frame)
+        gate.reset()
+        self.assertTrue(gate.changed(frame))
+
+
+class StubCascade:
+    """detectMultiScale que encuentra rostros fijos (en coordenadas del frame) dentro de la imagen.
+
+    Cada píxel del frame guarda y * 10000 + x, así se sabe qué ventana se buscó.
+    """
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.calls = []
+
+    def detectMultiScale(self, image, **kwargs):
+        y0, x0 = divmod(int(image[0, 0]), 10000)
+        height, width = image.shape[:2]
+        self.calls.append((x0, y0, width, height))
+        return [(x - x0, y - y0, w, h) for x, y, w, h in self.faces
+                if x >= x0 and y >= y0 and x + w <= x0 + width and y + h <= y0 + height]
+
+
+def coordinates_frame(width=300, height=200):
+    ys, xs = np.mgrid[:height, :width]
+    return SimpleNamespace(gray=ys * 10000 + xs)
+
+
+class TrackingFaceDetectorTests(TestCase):
+    def test_full_pass_every_n_frames(self):
+        cascade = StubCascade([(100, 50, 40, 40)])
+        detector = TrackingFaceDetector(cascade, full_every=3)
+        ctx = coordinates_frame()
+        for _ in range(7):
+            self.assertEqual(detector.detect(ctx), [(100, 50, 40, 40)])
+        full = [i for i, call in enumerate(cascade.calls) if call == (0, 0, 300, 200)]
+        self.assertEqual(full, [0, 3, 6])
+        self.assertEqual((detector.full_passes, detector.tracked_passes), (3, 4))
+
+    def test_search_window_is_clipped_to_the_frame(self):
+        faces = [(0, 0, 40, 40), (265, 165, 35, 35)]
+        cascade = StubCascade(faces)
+        detector = TrackingFaceDetector(cascade, full_every=10)
+        ctx = coordinates_frame()
+        detector.detect(ctx)
+        self.assertEqual(detector.detect(ctx), faces)
+        # Margen de medio rostro, recortado en los bordes
+        self.assertEqual(cascade.calls[1:], [(0, 0, 60, 60), (248, 148, 52, 52)])
+
+    def test_faces_found_from_two_windows_are_reported_once(self):
+        cascade = StubCascade([(100, 50, 40, 40)])
+        detector = TrackingFaceDetector(cascade, full_every=10)
+        detector.previous = [(100, 50, 40, 40), (104, 54, 40, 40)]
+        self.assertEqual(detector.detect(coordinates_frame()), [(100, 50, 40, 40)])
+        self.assertEqual(len(cascade.calls), 2)
+
+
+class DetectorBudgetTests(TestCase):
+    COSTS = {'face': 0.024, 'phone': 0.003, 'helmet': 0.001, 'mask': 0.0001}
+
+    def settle(self, budget, frames=50):
+        budget = DetectorBudget(budget)
+        for _ in range(frames):
+            for label, cost in self.COSTS.items():
+                budget.record(label, cost)
+            budget.adjust()
+        return budget
+
+    def test_only_expensive_detector_is_throttled(self):
+        budget = self.settle(0.02)
+        self.assertEqual(budget.every, {'face': 2})
+        self.assertLessEqual(budget.expected(), 0.02)
+
+    def test_cheap_detectors_are_never_throttled(self):
+        budget = self.settle(0.005)
+        self.assertEqual(budget.every, {'face': 8, 'phone': 4})
+        self.assertLessEqual(budget.expected(), 0.005)
+
+    def test_unreachable_budget_caps_expensive_detectors(self):
+        # Ni con face y phone cada 8 frames se baja de 10 ms: se espacian al máximo
+        # y los baratos siguen en cada frame
+        self.COSTS = {'face': 0.1, 'phone': 0.003, 'helmet': 0.001, 'mask': 0.0001}
+        budget = self.settle(0.01, frames=200)
+        self.assertEqual(budget.every, {'face': 8, 'phone': 8})
+        self.assertLess(budget.expected(), 0.015)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migra la app a migrate_from, deja cargar datos y migra a migrate_to"""
+    migrate_from = None
+    migrate_to = None
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('detection', target)])
+        return executor.loader.project_state([('detection', target)]).apps
+
+    def setUp(self):
+        self.old_apps = self.migrate(self.migrate_from)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes('detection')[0][1])
+
+
+class MigrateJsonObjectsTests(MigrationTestCase):
+    migrate_from = '0004_detectedobject'
+    migrate_to = '0005_migrate_json_objects'
+
+    def test_json_labels_become_detected_objects(self):
+        DetectionResult = self.old_apps.get_model('detection', 'DetectionResult')
+        result = DetectionResult.objects.create(
+            image='detections/a.jpg', objects_detected='["face", "phone"]',
+            confidence_scores='[0.9]', detection_count=2)
+        DetectionResult.objects.create(image='detections/b.jpg', objects_detected='no es json')
+        DetectionResult.objects.create(image='detections/c.jpg', objects_detected='')
+
+        apps = self.migrate(self.migrate_to)
+        DetectedObject = apps.get_model('detection', 'DetectedObject')
+        objects = DetectedObject.objects.order_by('label')
+        self.assertEqual(
+            [(o.detection_id, o.label, o.confidence, o.x) for o in objects],
+            [(result.id, 'face', 0.9, None), (result.id, 'phone', None, None)],
+        )
+        self.assertEqual(objects[0].created_at, result.created_at)
+
+        apps = self.migrate(self.migrate_from)
+        self.assertFalse(apps.get_model('detection', 'DetectedObject').objects.exists())
+
+
+def dnn_model(forward=None, **config):
+    """DnnModel con la red simulada; forward(blob) reemplaza la pasada"""
+    net = mock.Mock()
+    if forward is not None:
+        net.setInput.side_effect = lambda blob: setattr(net, 'blob', blob)
+        net.forward.side_effect = lambda: forward(net.blob)
+    with mock.patch('detection.dnn.os.path.isfile', return_value=True), \
+            mock.patch('detection.dnn.cv2.dnn.readNet', return_value=net):
+        return DnnModel({'model': 'model.onnx', 'input_size': 640, **config})
+
+
+# Cajas en píxeles de una entrada de 640x640; la imagen es de 640x480
+YOLO_ROWS = [
+    # cx, cy, w, h, objectness, persona, teléfono
+    [100, 100, 40, 40, 0.9, 0.9, 0.1],
+    [102, 100, 40, 40, 0.9, 0.8, 0.2],  # casi la misma persona: la descarta el NMS
+    [300, 200, 20, 20, 0.9, 0.1, 0.9],
+    [500, 400, 60, 60, 0.3, 0.9, 0.1],  # objectness baja
+]
+IMAGE_SHAPE = (480, 640, 3)
+PERSON = ('person', (80, 60, 40, 30))
+PHONE = ('phone', (290, 142, 20, 15))
+
+
+def parsed(model, output, index=0):
+    return sorted((label, box) for label, box, confidence in model._parse(output, index, IMAGE_SHAPE))
+
+
+class DnnParseTests(TestCase):
+    def test_yolov5(self):
+        model = dnn_model(format='yolov5', classes=['person', 'phone'])
+        output = np.array([YOLO_ROWS], dtype=np.float32)
+        self.assertEqual(parsed(model, output), [PERSON, PHONE])
+        self.assertEqual(
+            [confidence for _, _, confidence in model._parse(output, 0, IMAGE_SHAPE)], [0.81, 0.81])
+
+    def test_yolov8(self):
+        model = dnn_model(format='yolov8', classes=['person', 'phone'])
+        rows = np.array(YOLO_ROWS, dtype=np.float32)
+        # Sin objectness y con las filas en columnas
+        rows = np.concatenate([rows[:, :4], rows[:, 5:] * rows[:, 4:5]], axis=1)
+        output = rows.T[np.newaxis]
+        self.assertEqual(parsed(model, output), [PERSON, PHONE])
+
+    def test_ssd(self):
+        model = dnn_model(format='ssd', classes=['background', 'person', 'phone'])
+        output = np.array([[[
+            [0, 1, 0.9, 0.1, 0.1, 0.2, 0.2],
+            [1, 1, 0.9, 0.125, 0.125, 0.1875, 0.1875],
+            [1, 1, 0.8, 0.128, 0.125, 0.1906, 0.1875],  # se solapa con la anterior
+            [1, 2, 0.9, 0.5, 0.5, 0.75, 0.75],
+            [1, 2, 0.2, 0.0, 0.0, 0.5, 0.5],  # confianza baja
+        ]]], dtype=np.float32)
+        self.assertEqual(parsed(model, output, index=1), [('person', (80, 60, 40, 30)), ('phone', (320, 240, 160, 120))])
+        self.assertEqual(parsed(model, output, index=0), [('person', (64, 48, 64, 48))])
+
+    def test_labels_filter_and_rename_classes(self):
+        model = dnn_model(format='yolov5', classes=['person', 'phone'], labels={'phone': 'cellphone'})
+        output = np.array([YOLO_ROWS], dtype=np.float32)
+        self.assertEqual(parsed(model, output), [('cellphone', PHONE[1])])
+
+    def test_fixed_batch_model_is_probed_at_load(self):
+        def forward(blob):
+            if blob.shape[0] > 1:
+                raise cv2.error('lote fijo')
+            return np.array([YOLO_ROWS], dtype=np.float32)
+
+        model = dnn_model(forward, classes=['person', 'phone'])
+        self.assertEqual(model.batch_size, 1)
+        image = np.zeros(IMAGE_SHAPE, dtype=np.uint8)
+        self.assertEqual(len(model.detect([image, image, image])), 3)
+        self.assertEqual(model.net.forward.call_count, 4)
+
+        batched = dnn_model(lambda blob: np.zeros((blob.shape[0], 1, 7), dtype=np.float32))
+        self.assertEqual(batched.batch_size, 8)
+
+
+def jpeg_bytes(seed=0, size=(240, 320)):
+    """JPEG sintético con figuras de colores, distinto según seed"""
+    rng = np.random.default_rng(seed)
+    image = np.full(size + (3,), 40, np.uint8)
+    for _ in range(4):
+        x, y = int(rng.integers(0, size[1] - 60)), int(rng.integers(0, size[0] - 60))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + 50, y + 50), color, -1)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+class UploadTestCase(TestCase):
+    """Las imágenes se guardan en un MEDIA_ROOT temporal"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        upload_cache.clear()
+
+    def upload(self, data, query=''):
+        image = SimpleUploadedFile('foto.jpg', data, 'image/jpeg')
+        return self.client.post('/upload/' + query, {'image': image})
+
+
+class UploadImageTests(UploadTestCase):
+    def test_upload_saves_result_and_objects(self):
+        response = self.upload(jpeg_bytes())
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        result = DetectionResult.objects.get(id=data['id'])
+        self.assertEqual(result.detection_count, data['detection_count'])
+        self.assertEqual(json.loads(result.objects_detected), data['objects'])
+        self.assertEqual(
+            sorted(result.detected_objects.values_list('label', flat=True)), sorted(data['objects']))
+        self.assertEqual(len(result.content_hash), 64)
+
+    def test_repeated_upload_is_served_from_cache(self):
+        data = jpeg_bytes()
+        first = self.upload(data).json()
+        second = self.upload(data).json()
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['id'], first['id'])
+        self.assertEqual(second['objects'], first['objects'])
+        self.assertEqual(DetectionResult.objects.count(), 1)
+
+        # Tras vaciar la memoria se encuentra por el hash guardado en la base de datos
+        upload_cache.clear()
+        self.assertEqual(self.upload(data).json()['id'], first['id'])
+
+        # Con detectores elegidos no se usa la caché
+        third = self.upload(data, '?detectors=face').json()
+        self.assertNotIn('cached', third)
+        self.assertEqual(DetectionResult.objects.count(), 2)
+
+    @override_settings(DETECTION_MAX_SIZE=960)
+    def test_boxes_are_mapped_back_to_the_original_image(self):
+        shapes = []
+
+        def detect(detector, ctx):
+            shapes.append(ctx.frame.shape)
+            return [(96, 72, 48, 36)]
+
+        data = cv2.imencode('.jpg', np.full((3000, 4000, 3), 128, dtype=np.uint8))[1].tobytes()
+        with mock.patch('detection.pipeline.FaceDetector.detect', detect):
+            response = self.upload(data, '?detectors=face')
+        self.assertEqual(response.status_code, 200)
+        # Se detecta sobre una copia de 960x720 (escala 0.24)
+        self.assertEqual(shapes, [(720, 960, 3)])
+        obj = DetectedObject.objects.get(detection_id=response.json()['id'])
+        self.assertEqual((obj.label, obj.x, obj.y, obj.width, obj.height), ('face', 400, 300, 200, 150))
+
+    def test_invalid_image_and_unknown_detector(self):
+        self.assertEqual(self.upload(b'no es una imagen').status_code, 400)
+        response = self.upload(jpeg_bytes(), '?detectors=nada')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DetectionResult.objects.exists())
+
+
+class UploadBatchTests(UploadTestCase):
+    def test_batch_keeps_order_and_saves_valid_images(self):
+        images = [
+            SimpleUploadedFile('a.jpg', jpeg_bytes(1), 'image/jpeg'),
+            SimpleUploadedFile('b.jpg', b'rota', 'image/jpeg'),
+        ]
+        archive = make_zip([('c.jpg', jpeg_bytes(2)), ('leeme.txt', b'se ignora')])
+        # Bloques de 2: el lote se lee y se procesa en dos tandas
+        with mock.patch('detection.views.chunk_size', return_value=2):
+            response = self.client.post('/upload/batch/', {'images': images, 'archive': archive})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['name'] for r in results], ['a.jpg', 'b.jpg', 'c.jpg'])
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+
+        self.assertEqual(DetectionResult.objects.count(), 2)
+        expected = sum(r['detection_count'] for r in results if r['success'])
+        self.assertEqual(DetectedObject.objects.count(), expected)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+def save_result(created_at, detections):
+    result = DetectionResult.objects.create(
+        image='detections/x.jpg', detection_count=len(detections), created_at=created_at)
+    save_detected_objects(build_detected_objects(result, detections))
+    return result
+
+
+def rollup_counts(period):
+    return {
+        (r.bucket, r.label): (r.count, r.confidence_count, round(r.confidence_sum, 6))
+        for r in DetectionRollup.objects.filter(period=period)
+    }
+
+
+class RollupTests(TestCase):
+    def test_truncate(self):
+        moment = utc(2025, 1, 10, 8, 42, 17, 500)
+        self.assertEqual(truncate(moment, 'minute'), utc(2025, 1, 10, 8, 42))
+        self.assertEqual(truncate(moment, 'hour'), utc(2025, 1, 10, 8))
+
+    def test_saving_objects_increments_rollups(self):
+        save_result(utc(2025, 1, 10, 8, 0, 5), [('face', (0, 0, 1, 1), 0.5), ('phone', None, None)])
+        save_result(utc(2025, 1, 10, 8, 0, 40), [('face', (0, 0, 1, 1), 0.7)])
+        save_result(utc(2025, 1, 10, 8, 1, 0), [('face', (0, 0, 1, 1), 0.9)])
+
+        self.assertEqual(rollup_counts('minute'), {
+            (utc(2025, 1, 10, 8, 0), 'face'): (2, 2, 1.2),
+            (utc(2025, 1, 10, 8, 0), 'phone'): (1, 0, 0.0),
+            (utc(2025, 1, 10, 8, 1), 'face'): (1, 1, 0.9),
+        })
+        self.assertEqual(rollup_counts('hour'), {
+            (utc(2025, 1, 10, 8), 'face'): (3, 3, 2.1),
+            (utc(2025, 1, 10, 8), 'phone'): (1, 0, 0.0),
+        })
+
+    def test_deleting_results_decrements_rollups(self):
+        keep = save_result(utc(2025, 1, 10, 8, 0), [('face', None, 0.5)])
+        gone = save_result(utc(2025, 1, 10, 8, 0), [('face', None, 0.5), ('mask', None, 0.5)])
+        gone.delete()
+        expected = {
+            'hour': {(utc(2025, 1, 10, 8), 'face'): (1, 1, 0.5)},
+            'minute': {(utc(2025, 1, 10, 8, 0), 'face'): (1, 1, 0.5)},
+        }
+        for period, counts in expected.items():
+            self.assertEqual(rollup_counts(period), counts)
+
+        rebuild_rollups()
+        for period, counts in expected.items():
+            self.assertEqual(rollup_counts(period), counts)
+        self.assertTrue(DetectionResult.objects.filter(id=keep.id).exists())
+
+    def test_deleting_objects_decrements_rollups(self):
+        save_result(utc(2025, 1, 10, 8, 0), [('face', None, 0.5), ('face', None, None)])
+        save_result(utc(2025, 1, 10, 9, 0), [('phone', None, 0.8)])
+        DetectedObject.objects.filter(confidence__isnull=True).delete()
+        DetectionResult.objects.filter(created_at__gte=utc(2025, 1, 10, 9)).delete()
+        self.assertEqual(rollup_counts('hour'), {(utc(2025, 1, 10, 8), 'face'): (1, 1, 0.5)})
+
+
+class BackfillRollupsTests(MigrationTestCase):
+    migrate_from = '0006_detectionrollup'
+    migrate_to = '0007_backfill_rollups'
+
+    def test_existing_objects_are_summarized(self):
+        DetectionResult = self.old_apps.get_model('detection', 'DetectionResult')
+        DetectedObject = self.old_apps.get_model('detection', 'DetectedObject')
+        result = DetectionResult.objects.create(image='detections/a.jpg')
+        for moment, label, confidence in [
+            (utc(2025, 1, 10, 8, 0, 5), 'face', 0.5),
+            (utc(2025, 1, 10, 8, 0, 50), 'face', None),
+            (utc(2025, 1, 10, 8, 30), 'face', 0.7),
+            (utc(2025, 1, 10, 9, 0), 'phone', 0.9),
+        ]:
+            DetectedObject.objects.create(
+                detection=result, label=label, confidence=confidence, created_at=moment)
+
+        self.migrate(self.migrate_to)
+        self.assertEqual(rollup_counts('minute'), {
+            (utc(2025, 1, 10, 8, 0), 'face'): (2, 1, 0.5),
+            (utc(2025, 1, 10, 8, 30), 'face'): (1, 1, 0.7),
+            (utc(2025, 1, 10, 9, 0), 'phone'): (1, 1, 0.9),
+        })
+        self.assertEqual(rollup_counts('hour'), {
+            (utc(2025, 1, 10, 8), 'face'): (3, 2, 1.2),
+            (utc(2025, 1, 10, 9), 'phone'): (1, 1, 0.9),
+        })
+
+
+class StatsViewTests(TestCase):
+    def setUp(self):
+        save_result(utc(2025, 1, 10, 8, 0, 5), [('face', None, 0.5), ('phone', None, 0.9)])
+        save_result(utc(2025, 1, 10, 8, 1, 0), [('face', None, 0.7)])
+        save_result(utc(2025, 1, 10, 10, 0), [('face', None, 0.1)])
+
+    def test_minute_series_and_totals(self):
+        response = self.client.get('/stats/', {
+            'period': 'minute', 'since': '2025-01-10T08:00:00', 'until': '2025-01-10T09:00:00'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [(row['bucket'], row['label'], row['count']) for row in data['series']],
+            [('2025-01-10T08:00:00+00:00', 'face', 1),
+             ('2025-01-10T08:00:00+00:00', 'phone', 1),
+             ('2025-01-10T08:01:00+00:00', 'face', 1)],
+        )
+        self.assertEqual([(t['label'], t['count']) for t in data['totals']], [('face', 2), ('phone', 1)])
+        self.assertAlmostEqual(data['totals'][0]['avg_confidence'], 0.6)
+
+    def test_hour_series_filtered_by_label(self):
+        data = self.client.get('/stats/', {
+            'period': 'hour', 'since': '2025-01-10T00:00:00Z', 'until': '2025-01-11T00:00:00Z',
+            'label': 'face'}).json()
+        self.assertEqual([(row['bucket'], row['count']) for row in data['series']],
+                         [('2025-01-10T08:00:00+00:00', 2), ('2025-01-10T10:00:00+00:00', 1)])
+        self.assertEqual(data['totals'][0]['count'], 3)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/stats/', {'period': 'day'}).status_code, 400)
+        self.assertEqual(self.client.get('/stats/', {'since': 'ayer'}).status_code, 400)
+
+
+class AnalyzeVideoCommandTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = f'{directory}/video.avi'
+        writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for i in range(20):
+            writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+        writer.release()
+
+    def test_reports_frames_read_not_last_sampled(self):
+        out = io.StringIO()
+        call_command('analyze_video', self.path, '--stride', '3', '--dry-run', stdout=out)
+        # Se muestrean 0, 3, ..., 18 pero se leen los 20 frames
+        self.assertIn('7 frames analizados de 20 ', out.getvalue())
+
+        out = io.StringIO()
+        call_command('analyze_video', self.path, '--stride', '3', '--max-frames', '10', '--dry-run', stdout=out)
+        self.assertIn('4 frames analizados de 10 ', out.getvalue())
@@ -0,0 +1,52 @@
+import hashlib
+import io
+import mmap
+from contextlib import contextmanager
+from .resources import cv2, np
+
+
+@contextmanager
+def upload_buffer(uploaded_file):
+    """Buffer de solo lectura con el contenido subido, sin copiarlo.
+
+    Si Django guardó la subida en un archivo temporal se mapea en memoria;
+    si está en memoria se usa directamente el contenido del BytesIO.
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        with open(uploaded_file.temporary_file_path(), 'rb') as f:
+            if uploaded_file.size == 0:
+                yield b''
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+        return
+
+    raw = getattr(uploaded_file, 'file', None)
+    if isinstance(raw, io.BytesIO):
+        # getvalue() comparte el bytes interno del BytesIO (getbuffer() lo copiaría)
+        yield raw.getvalue()
+        return
+
+    # Otro tipo de archivo: no queda más remedio que leerlo
+    uploaded_file.seek(0)
+    yield uploaded_file.read()
+
+
+def decode_upload(uploaded_file):
+    """Decodificar la imagen subida directamente desde su buffer"""
+    with upload_buffer(uploaded_file) as buffer:
+        nparr = np.frombuffer(buffer, np.uint8)
+        try:
+            return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        finally:
+            # El buffer no se puede cerrar mientras el array lo referencia
+            del nparr
+
+
+def hash_upload(uploaded_file):
+    """SHA-256 del contenido subido, calculado sobre el mismo buffer sin copia"""
+    with upload_buffer(uploaded_file) as buffer:
+        return hashlib.sha256(buffer).hexdigest()
@@ -6,6 +6,12 @@ app_name = 'detection'
 urlpatterns = [
     path('', views.index, name='index'),
     path('video_feed/', views.video_feed, name='video_feed'),
+    path('video_feed/<str:camera_id>/', views.video_feed, name='camera_feed'),
     path('upload/', views.upload_image, name='upload_image'),
+    path('upload/batch/', views.upload_batch, name='upload_batch'),
+    path('stats/', views.detection_stats, name='detection_stats'),
+    # Sin barra final: es la ruta que Prometheus consulta por defecto
+    path('metrics', views.metrics, name='metrics'),
     path('detect/', views.detect_objects, name='detect_objects'),
+    path('detect/stream/', views.detect_stream, name='detect_stream'),
 ]
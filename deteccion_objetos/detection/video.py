@@ -0,0 +1,114 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .batch import _init_worker
+from .pipeline import DETECTION_MAX_SIZE, DetectionPipeline
+from .resources import OPENCV_AVAILABLE, cv2, face_cascade
+
+# Análisis de videos grabados, por rangos de frames en procesos del pool de batch.py
+
+# FPS supuestos cuando el origen no informa los suyos
+DEFAULT_FPS = 30.0
+
+# Frames consecutivos que se pasan juntos al pipeline (la red dnn los procesa en una pasada)
+FRAME_BATCH = 8
+
+
+def open_video(source):
+    if not OPENCV_AVAILABLE:
+        raise IOError("OpenCV no está disponible")
+    video = cv2.VideoCapture(source)
+    if not video.isOpened():
+        raise IOError(f"No se pudo abrir el video {source}")
+    return video
+
+
+def video_info(source):
+    """(cantidad de frames, fps) del video; 0 frames si no se conoce (p. ej. un stream)"""
+    video = open_video(source)
+    try:
+        frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = video.get(cv2.CAP_PROP_FPS)
+    finally:
+        video.release()
+    return max(frames, 0), fps or DEFAULT_FPS
+
+
+def read_frames(source, stride=1, start=0, end=None, stats=None):
+    """Generador de (índice, frame) de los frames múltiplos de stride entre start y end.
+
+    Los frames intermedios solo se avanzan con grab(), sin convertirlos a imagen.
+    Si se pasa un dict stats, stats['read'] cuenta los frames leídos o avanzados.
+    """
+    video = open_video(source)
+    try:
+        if start:
+            video.set(cv2.CAP_PROP_POS_FRAMES, start)
+        index = start
+        while end is None or index < end:
+            if index % stride:
+                ok, frame = video.grab(), None
+            else:
+                ok, frame = video.read()
+            if not ok:
+                break
+            if stats is not None:
+                stats['read'] = stats.get('read', 0) + 1
+            if frame is not None:
+                yield index, frame
+            index += 1
+    finally:
+        video.release()
+
+
+def _batches(frames, size):
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_detections(source, stride=1, start=0, end=None, max_size=DETECTION_MAX_SIZE, track_every=0,
+                    names=None, dnn=None, stats=None):
+    """Generador de (índice de frame, [(etiqueta, caja, confianza)]) de los frames muestreados"""
+    with face_cascade() as cascade:
+        pipeline = DetectionPipeline(cascade, track_every=track_every, max_size=max_size, names=names, dnn=dnn)
+        for batch in _batches(read_frames(source, stride, start, end, stats), FRAME_BATCH):
+            results = pipeline.run_batch([frame for _, frame in batch])
+            for (index, _), detections in zip(batch, results):
+                # Tuplas simples para devolverlas al proceso principal
+                yield index, [(d.label, tuple(int(v) for v in d.box), d.confidence) for d in detections]
+
+
+def analyze_range(source, start, end, stride=1, max_size=DETECTION_MAX_SIZE, track_every=0, names=None,
+                  dnn=None):
+    """(resultados, frames leídos) de un rango de frames, para ejecutar en un proceso del pool"""
+    stats = {'read': 0}
+    results = list(iter_detections(source, stride, start, end, max_size, track_every, names, dnn, stats))
+    return results, stats['read']
+
+
+def frame_ranges(total, chunks):
+    """Dividir [0, total) en hasta chunks rangos contiguos de tamaño similar"""
+    chunks = max(1, min(chunks, total))
+    size, extra = divmod(total, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def create_executor(workers):
+    """Pool de procesos para analizar rangos de un video en paralelo"""
+    # spawn, como en batch.py, para no heredar hilos ni conexiones abiertas
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
@@ -1,206 +1,54 @@
+import asyncio
 import json
 import time
 import io
 import base64
+import zipfile
+from contextlib import aclosing, contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.core.exceptions import RequestDataTooBig, SuspiciousOperation, TooManyFilesSent
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
 from django.http import StreamingHttpResponse, JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.conf import settings
-from .models import DetectionResult
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import DetectionResult, build_detected_objects
+from .camera import DEFAULT_CONFIDENCE
+from .batch import IMAGE_EXTENSIONS, MAX_BATCH_FILES, MAX_BATCH_SIZE, MAX_UPLOAD_SIZE, chunk_size, detect_many
+from .cache import cached_objects, find_by_hash, remember
+from .encoding import AdaptiveQuality, parse_stream_params
+from .metrics import registry as metrics_registry
+from .pipeline import DETECTION_MAX_SIZE, DetectionPipeline, parse_detector_names, resolve_detectors
+from .registry import DEFAULT_CAMERA, CameraUnavailable, UnknownCamera, camera_registry
+from .resources import OPENCV_AVAILABLE, cv2, face_cascade
+from .rollups import PERIODS, rollup_series, rollup_totals, save_detected_objects
+from .uploads import decode_upload, hash_upload
 from PIL import Image
 
-# Intentar importar OpenCV y numpy
-try:
-    import cv2
-    import numpy as np
-    OPENCV_AVAILABLE = True
-except ImportError:
-    OPENCV_AVAILABLE = False
-    cv2 = None
-    np = None
-
 # Variables globales para el streaming de video
-camera = None
+# (las cámaras y sus difusores viven en registry.camera_registry)
 detection_active = False
 
-class VideoCamera:
-    def __init__(self):
-        if not OPENCV_AVAILABLE:
-            raise Exception("OpenCV no está disponible")
-        
-        self.video = cv2.VideoCapture(0)
-        if not self.video.isOpened():
-            # Si la cámara principal no está disponible, intentar con índice 1
-            self.video = cv2.VideoCapture(1)
-        
-        self.video.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.video.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
-        # Cargar el clasificador Haar Cascade para detección de rostros
-        try:
-            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        except:
-            self.face_cascade = None
-        
-        self.detection_enabled = True
-        
-    def __del__(self):
-        if hasattr(self, 'video') and self.video:
-            self.video.release()
-        
-    def get_frame(self):
-        if not self.video or not self.video.isOpened():
-            return None
-            
-        success, image = self.video.read()
-        if not success:
-            return None
-            
-        if self.detection_enabled and self.face_cascade is not None:
-            image = self.detect_objects(image)
-            
-        ret, jpeg = cv2.imencode('.jpg', image)
-        if ret:
-            return jpeg.tobytes()
-        return None
-    
-    def detect_objects(self, frame):
-        try:
-            detected_objects = []
-            
-            # Detección de rostros usando Haar Cascades
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
-            
-            # Dibujar rectángulos alrededor de los rostros detectados
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                cv2.putText(frame, 'Face', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
-                detected_objects.append('face')
-            
-            # Detección de cascos (basada en color amarillo/naranja)
-            helmets = self.detect_helmets(frame)
-            for (x, y, w, h) in helmets:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 255), 2)
-                cv2.putText(frame, 'Helmet', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
-                detected_objects.append('helmet')
-            
-            # Detección de teléfonos (basada en forma rectangular)
-            phones = self.detect_phones(frame)
-            for (x, y, w, h) in phones:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 0), 2)
-                cv2.putText(frame, 'Phone', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 0), 2)
-                detected_objects.append('phone')
-            
-            # Detección de mascarillas (basada en región facial inferior)
-            masks = self.detect_masks(frame, faces)
-            for (x, y, w, h) in masks:
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(frame, 'Mask', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                detected_objects.append('mask')
-            
-            # Almacenar detección si hay objetos encontrados
-            if detected_objects:
-                self.save_detection(detected_objects)
-                
-        except Exception as e:
-            print(f"Error en detección: {e}")
-        
-        return frame
-    
-    def detect_helmets(self, frame):
-        """Detectar cascos basado en color amarillo/naranja"""
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        
-        # Rango de colores para cascos (amarillo/naranja)
-        lower_yellow = np.array([15, 100, 100])
-        upper_yellow = np.array([35, 255, 255])
-        
-        mask = cv2.inRange(hsv, lower_yellow, upper_yellow)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5,5), np.uint8))
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((10,10), np.uint8))
-        
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        helmets = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 1000:  # Filtrar por área mínima
-                x, y, w, h = cv2.boundingRect(contour)
-                # Verificar proporciones típicas de un casco
-                if 0.7 <= w/h <= 1.5 and y < frame.shape[0] * 0.6:  # En la parte superior
-                    helmets.append((x, y, w, h))
-        
-        return helmets
-    
-    def detect_phones(self, frame):
-        """Detectar teléfonos basado en forma rectangular"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        phones = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if 500 < area < 5000:  # Área típica de un teléfono
-                x, y, w, h = cv2.boundingRect(contour)
-                aspect_ratio = w / h
-                # Verificar proporciones típicas de un teléfono (vertical u horizontal)
-                if (0.4 <= aspect_ratio <= 0.8) or (1.2 <= aspect_ratio <= 2.5):
-                    phones.append((x, y, w, h))
-        
-        return phones
-    
-    def detect_masks(self, frame, faces):
-        """Detectar mascarillas en la región facial inferior"""
-        masks = []
-        
-        for (fx, fy, fw, fh) in faces:
-            # Región inferior del rostro donde estaría la mascarilla
-            mask_y = fy + int(fh * 0.5)
-            mask_h = int(fh * 0.4)
-            
-            if mask_y + mask_h < frame.shape[0]:
-                roi = frame[mask_y:mask_y+mask_h, fx:fx+fw]
-                
-                # Detectar colores típicos de mascarillas (azul, blanco, negro)
-                hsv_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-                
-                # Máscara para colores típicos de mascarillas
-                lower_blue = np.array([100, 50, 50])
-                upper_blue = np.array([130, 255, 255])
-                mask_blue = cv2.inRange(hsv_roi, lower_blue, upper_blue)
-                
-                lower_white = np.array([0, 0, 200])
-                upper_white = np.array([180, 30, 255])
-                mask_white = cv2.inRange(hsv_roi, lower_white, upper_white)
-                
-                combined_mask = cv2.bitwise_or(mask_blue, mask_white)
-                
-                # Si hay suficientes píxeles de color de mascarilla
-                if np.sum(combined_mask) > roi.shape[0] * roi.shape[1] * 0.3:
-                    masks.append((fx, mask_y, fw, mask_h))
-        
-        return masks
-    
-    def save_detection(self, detected_objects):
-        """Guardar detección en la base de datos"""
-        try:
-            detection = DetectionResult()
-            detection.objects_detected = json.dumps(detected_objects)
-            detection.confidence_scores = json.dumps([0.8] * len(detected_objects))
-            detection.detection_count = len(detected_objects)
-            detection.save()
-        except Exception as e:
-            print(f"Error guardando detección: {e}")
+# Confianza asignada a las detecciones heurísticas de imágenes subidas
+UPLOAD_CONFIDENCE = 0.85
+
+# Espera máxima de /detect/?since= (long-polling) y del stream antes de un keep-alive
+DETECT_POLL_TIMEOUT = 30.0
+DETECT_KEEPALIVE = 15.0
+# Milisegundos que espera el navegador antes de reconectar el EventSource
+SSE_RETRY_MS = 3000
+
+# Rango por defecto de /stats/ según el intervalo pedido
+STATS_WINDOWS = {
+    'minute': timedelta(hours=1),
+    'hour': timedelta(hours=24),
+}
 
 def index(request):
     """Vista principal de la aplicación"""
@@ -211,32 +59,86 @@ def index(request):
     }
     return render(request, 'detection/index.html', context)
 
-def gen(camera):
-    """Generador para el streaming de video"""
-    while True:
-        if camera:
-            frame = camera.get_frame()
-            if frame is not None:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
-        time.sleep(0.1)
-
-def video_feed(request):
-    """Vista para el feed de video en tiempo real"""
-    global camera
-    
+def mjpeg_part(data):
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + data + b'\r\n\r\n')
+
+def gen(broadcaster, quality=None, width=None):
+    """Generador para el streaming de video; sin calidad fija se adapta al cliente"""
+    # Los espectadores que piden la misma variante reciben los mismos bytes, codificados una vez
+    adaptive = AdaptiveQuality() if quality is None else None
+    for frame in broadcaster.subscribe():
+        data = frame.encode(adaptive.quality if adaptive else quality, width)
+        if data is None:
+            continue
+        started = time.monotonic()
+        yield mjpeg_part(data)
+        # El generador se reanuda cuando el servidor terminó de escribir el frame
+        if adaptive is not None:
+            adaptive.update(time.monotonic() - started)
+
+async def agen(broadcaster, quality=None, width=None):
+    """Generador asíncrono para el streaming de video bajo ASGI"""
+    loop = asyncio.get_running_loop()
+    adaptive = AdaptiveQuality() if quality is None else None
+    # aclosing: al cortar la conexión el espectador se da de baja enseguida
+    async with aclosing(broadcaster.subscribe_async()) as frames:
+        async for frame in frames:
+            data = await encode_variant(loop, frame, adaptive.quality if adaptive else quality, width)
+            if data is None:
+                continue
+            started = time.monotonic()
+            yield mjpeg_part(data)
+            if adaptive is not None:
+                adaptive.update(time.monotonic() - started)
+
+async def encode_variant(loop, frame, quality, width):
+    """Variante JPEG del frame; si nadie la codificó aún, se codifica fuera del event loop"""
+    data = frame.cached(quality, width)
+    if data is None:
+        data = await loop.run_in_executor(None, frame.encode, quality, width)
+    return data
+
+def get_broadcaster(camera_id=DEFAULT_CAMERA):
+    """Difusor de la cámara pedida; la cámara se abre con el primer espectador"""
+    return camera_registry.get(camera_id)
+
+def get_camera(camera_id=DEFAULT_CAMERA):
+    """Cámara abierta con ese id, o None si nadie está mirando su video"""
+    broadcaster = camera_registry.peek(camera_id)
+    return broadcaster.camera if broadcaster is not None else None
+
+async def video_feed(request, camera_id=DEFAULT_CAMERA):
+    """Vista para el feed de video en tiempo real (?q= calidad JPEG o auto, ?w= ancho)"""
     if not OPENCV_AVAILABLE:
         return HttpResponse("OpenCV no está disponible. Por favor instale opencv-python.", 
                           content_type="text/plain", status=503)
     
-    if camera is None:
-        try:
-            camera = VideoCamera()
-        except Exception as e:
-            return HttpResponse(f"Error al acceder a la cámara: {str(e)}", 
-                              content_type="text/plain", status=500)
+    try:
+        quality, width = parse_stream_params(request.GET)
+    except ValueError:
+        return HttpResponse("Parámetros inválidos: q debe ser 1-100 o auto y w un entero", 
+                          content_type="text/plain", status=400)
     
-    return StreamingHttpResponse(gen(camera),
+    try:
+        # Abrir la cámara bloquea: se hace fuera del event loop
+        feed = await sync_to_async(get_broadcaster)(camera_id)
+    except UnknownCamera:
+        return HttpResponse(f"Cámara desconocida: {camera_id}", 
+                          content_type="text/plain", status=404)
+    except CameraUnavailable as e:
+        return HttpResponse(str(e), content_type="text/plain", status=503)
+    except Exception as e:
+        return HttpResponse(f"Error al acceder a la cámara: {str(e)}", 
+                          content_type="text/plain", status=500)
+    
+    if isinstance(request, ASGIRequest):
+        # Bajo ASGI cada espectador es una corrutina que espera en su cola, sin hilo propio
+        stream = agen(feed, quality, width)
+    else:
+        # Bajo WSGI Django leería entero un iterador asíncrono: se usa el generador normal
+        stream = gen(feed, quality, width)
+    return StreamingHttpResponse(stream,
                                content_type='multipart/x-mixed-replace; boundary=frame')
 
 @csrf_exempt
@@ -247,53 +149,34 @@ def upload_image(request):
     
     if request.method == 'POST' and request.FILES.get('image'):
         try:
-            image_file = request.FILES['image']
-            
-            # Leer y procesar la imagen
-            image_data = image_file.read()
-            image_file.seek(0)  # Reset file pointer
-            
-            # Convertir a formato OpenCV
-            nparr = np.frombuffer(image_data, np.uint8)
-            cv_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            names = request_detectors(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        image_file = request.FILES['image']
+        if image_file.size > max_upload_size():
+            return JsonResponse({'error': f'La imagen supera {max_upload_size()} bytes'}, status=400)
+        
+        try:
+            # Una imagen ya procesada se responde sin volver a detectar; la caché
+            # guarda resultados con todos los detectores, así que con ?detectors= no se usa
+            content_hash = hash_upload(image_file) if names is None else ''
+            cached = find_by_hash(content_hash) if content_hash else None
+            if cached is not None:
+                data = detection_result_data(cached, cached_objects(cached))
+                data['cached'] = True
+                return JsonResponse(data)
+            
+            # Convertir a formato OpenCV directamente desde el buffer de la subida
+            cv_image = decode_upload(image_file)
             
             if cv_image is None:
                 return JsonResponse({'error': 'Imagen inválida'}, status=400)
             
             # Realizar detección de objetos
-            detected_objects = []
-            
-            # Detección de rostros
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-            
-            # Procesar detecciones
-            for (x, y, w, h) in faces:
-                cv2.rectangle(cv_image, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                cv2.putText(cv_image, 'Face', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
-                detected_objects.append('face')
-            
-            # Detectar cascos usando método auxiliar
-            helmets = detect_helmets_static(cv_image)
-            for (x, y, w, h) in helmets:
-                cv2.rectangle(cv_image, (x, y), (x+w, y+h), (0, 255, 255), 2)
-                cv2.putText(cv_image, 'Helmet', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
-                detected_objects.append('helmet')
-            
-            # Detectar teléfonos
-            phones = detect_phones_static(cv_image)
-            for (x, y, w, h) in phones:
-                cv2.rectangle(cv_image, (x, y), (x+w, y+h), (255, 255, 0), 2)
-                cv2.putText(cv_image, 'Phone', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 0), 2)
-                detected_objects.append('phone')
-            
-            # Detectar mascarillas
-            masks = detect_masks_static(cv_image, faces)
-            for (x, y, w, h) in masks:
-                cv2.rectangle(cv_image, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(cv_image, 'Mask', (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                detected_objects.append('mask')
+            with face_cascade() as cascade:
+                detections = DetectionPipeline(cascade, max_size=detection_max_size(),
+                                               names=names, dnn=detection_dnn()).process(cv_image)
             
             # Guardar imagen procesada
             ret, buffer = cv2.imencode('.jpg', cv_image)
@@ -303,144 +186,377 @@ def upload_image(request):
             processed_image_data = buffer.tobytes()
             
             # Crear registro de detección
-            detection_result = DetectionResult()
-            
-            # Guardar imagen original
-            original_path = default_storage.save(
-                f'detections/original_{int(time.time())}.jpg',
-                ContentFile(image_file.read())
+            image_file.seek(0)
+            detection_result = build_detection_result(
+                image_file, processed_image_data, detections
             )
-            detection_result.image = original_path
+            detection_result.content_hash = content_hash
+            with transaction.atomic():
+                detection_result.save()
+                save_detected_objects(
+                    build_detected_objects(detection_result, detections, UPLOAD_CONFIDENCE)
+                )
+            remember(detection_result)
             
-            # Guardar imagen procesada
-            processed_path = default_storage.save(
-                f'processed/processed_{int(time.time())}.jpg',
-                ContentFile(processed_image_data)
-            )
-            
-            # Guardar datos de detección
-            detection_result.objects_detected = json.dumps(detected_objects)
-            detection_result.confidence_scores = json.dumps([0.85] * len(detected_objects))
-            detection_result.detection_count = len(detected_objects)
-            
-            detection_result.save()
-            
-            return JsonResponse({
-                'success': True,
-                'detection_count': detection_result.detection_count,
-                'objects': detected_objects,
-                'original_image_url': settings.MEDIA_URL + original_path,
-                'processed_image_url': settings.MEDIA_URL + processed_path,
-                'id': detection_result.id
-            })
-            
-        except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
-    
-    return JsonResponse({'error': 'Método no permitido'}, status=405)
-
-def detect_objects(request):
-    """API endpoint para detección en tiempo real"""
-    if request.method == 'GET':
-        try:
-            # Simular datos de detección en tiempo real
-            detection_data = {
-                'timestamp': int(time.time()),
-                'objects_detected': ['face', 'person'],
-                'coordinates': [[100, 100, 200, 200], [300, 150, 400, 350]],
-                'confidence': [0.95, 0.87]
-            }
-            
-            return JsonResponse(detection_data)
+            return JsonResponse(detection_result_data(detection_result, [d.label for d in detections]))
             
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
-# Funciones auxiliares para detección estática en imágenes subidas
-
-def detect_helmets_static(frame):
-    """Detectar cascos basado en color amarillo/naranja en imagen estática"""
+@csrf_exempt
+def upload_batch(request):
+    """Vista para subir varias imágenes (o un zip) y procesarlas en paralelo"""
     if not OPENCV_AVAILABLE:
-        return []
+        return JsonResponse({'error': 'OpenCV no está disponible'}, status=503)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        # Leer el formulario aquí para responder en JSON si Django lo rechaza
+        request.FILES
+    except TooManyFilesSent:
+        return JsonResponse({'error': f'Máximo {MAX_BATCH_FILES} imágenes por lote'}, status=400)
+    except (SuspiciousOperation, RequestDataTooBig) as e:
+        return JsonResponse({'error': f'Petición inválida: {e}'}, status=400)
+    
+    try:
+        names = request_detectors(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    try:
+        with batch_images(request) as sources:
+            entries = []
+            # De a un bloque por vez: solo sus imágenes están en memoria y en el pool
+            for start in range(0, len(sources), chunk_size()):
+                chunk = [(name, read()) for name, read in sources[start:start + chunk_size()]]
+                outputs = detect_many(chunk, detection_max_size(), names, detection_dnn())
+                for (name, data), output in zip(chunk, outputs):
+                    if output is None:
+                        entries.append((name, None, None))
+                        continue
+                    detections, processed_image_data = output
+                    entries.append((name, detections,
+                                    build_detection_result(data, processed_image_data, detections)))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
     
-    # Rango de colores para cascos (amarillo/naranja)
-    lower_yellow = np.array([15, 100, 100])
-    upper_yellow = np.array([35, 255, 255])
+    try:
+        # Un solo INSERT para todo el lote (y otro para sus objetos)
+        saved = [result for _, _, result in entries if result is not None]
+        with transaction.atomic():
+            DetectionResult.objects.bulk_create(saved)
+            objects = []
+            for _, detections, detection_result in entries:
+                if detection_result is not None:
+                    objects.extend(build_detected_objects(detection_result, detections, UPLOAD_CONFIDENCE))
+            save_detected_objects(objects)
+        
+        results = []
+        for name, detections, detection_result in entries:
+            if detection_result is None:
+                results.append({'name': name, 'success': False, 'error': 'Imagen inválida'})
+            else:
+                labels = [label for label, _, _ in detections]
+                results.append({'name': name, **detection_result_data(detection_result, labels)})
+        
+        return JsonResponse({
+            'success': True,
+            'count': len(results),
+            'processed': len(saved),
+            'results': results
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+def detection_stats(request):
+    """API de estadísticas por etiqueta, servida desde los resúmenes por minuto/hora"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
     
-    mask = cv2.inRange(hsv, lower_yellow, upper_yellow)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5,5), np.uint8))
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((10,10), np.uint8))
+    period = request.GET.get('period', 'hour')
+    if period not in PERIODS:
+        return JsonResponse({'error': f"period debe ser uno de: {', '.join(PERIODS)}"}, status=400)
     
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    try:
+        until = parse_stats_time(request.GET.get('until')) or timezone.now()
+        since = parse_stats_time(request.GET.get('since')) or until - STATS_WINDOWS[period]
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida, use formato ISO 8601'}, status=400)
     
-    helmets = []
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > 1000:  # Filtrar por área mínima
-            x, y, w, h = cv2.boundingRect(contour)
-            # Verificar proporciones típicas de un casco
-            if 0.7 <= w/h <= 1.5 and y < frame.shape[0] * 0.6:  # En la parte superior
-                helmets.append((x, y, w, h))
+    rollups = rollup_series(period, since, until, request.GET.get('label') or None)
+    series = [
+        {
+            'bucket': rollup.bucket.isoformat(),
+            'label': rollup.label,
+            'count': rollup.count,
+            'avg_confidence': rollup.avg_confidence,
+        }
+        for rollup in rollups
+    ]
     
-    return helmets
+    return JsonResponse({
+        'period': period,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'series': series,
+        'totals': rollup_totals(rollups),
+    })
 
-def detect_phones_static(frame):
-    """Detectar teléfonos basado en forma rectangular en imagen estática"""
-    if not OPENCV_AVAILABLE:
-        return []
+def metrics(request):
+    """Métricas del proceso en formato de texto de Prometheus"""
+    if request.method != 'GET':
+        return HttpResponse('Método no permitido', content_type='text/plain', status=405)
+    return HttpResponse(metrics_registry.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def parse_stats_time(value):
+    """Fecha ISO 8601 de la query string; sin zona horaria se asume UTC"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+def max_upload_size():
+    """Bytes máximos de cada imagen subida"""
+    return getattr(settings, 'DETECTION_MAX_UPLOAD_SIZE', MAX_UPLOAD_SIZE)
+
+def max_batch_size():
+    """Bytes máximos de todas las imágenes de un lote"""
+    return getattr(settings, 'DETECTION_MAX_BATCH_SIZE', MAX_BATCH_SIZE)
+
+def _read_member(zf, info):
+    try:
+        # zipfile no entrega más bytes que el file_size declarado, ya comprobado
+        return zf.read(info)
+    except (zipfile.BadZipFile, EOFError, OSError) as e:
+        # Un miembro dañado queda como imagen inválida, sin cancelar el lote
+        print(f"Error leyendo {info.filename} del zip: {e}")
+        return b''
+
+@contextmanager
+def batch_images(request):
+    """[(nombre, función que devuelve los bytes)] de las imágenes subidas y de las del zip.
+
+    Cantidad y tamaños (de cada una y en total) se comprueban con los datos del
+    formulario y del índice del zip antes de leer o descomprimir nada; lanza
+    ValueError si no se cumplen. El zip queda abierto hasta salir del with.
+    """
+    files = request.FILES.getlist('images')
+    archive = request.FILES.get('archive')
+    try:
+        zf = zipfile.ZipFile(archive) if archive is not None else None
+    except zipfile.BadZipFile:
+        raise ValueError('El archivo no es un zip válido')
+    try:
+        members = []
+        if zf is not None:
+            members = [
+                info for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+        count = len(files) + len(members)
+        if not count:
+            raise ValueError('No se recibieron imágenes')
+        if count > MAX_BATCH_FILES:
+            raise ValueError(f'Máximo {MAX_BATCH_FILES} imágenes por lote')
+        limit = max_upload_size()
+        too_large = [f.name for f in files if f.size > limit]
+        too_large += [info.filename for info in members if info.file_size > limit]
+        if too_large:
+            raise ValueError(f"Imágenes de más de {limit} bytes: {', '.join(too_large[:10])}")
+        total = sum(f.size for f in files) + sum(info.file_size for info in members)
+        if total > max_batch_size():
+            raise ValueError(f'El lote ocupa {total} bytes; el máximo es {max_batch_size()}')
+        
+        sources = [(f.name, f.read) for f in files]
+        sources.extend((info.filename, lambda info=info: _read_member(zf, info)) for info in members)
+        yield sources
+    finally:
+        if zf is not None:
+            zf.close()
+
+def detection_max_size():
+    """Resolución de trabajo configurada para las imágenes subidas"""
+    return getattr(settings, 'DETECTION_MAX_SIZE', DETECTION_MAX_SIZE)
+
+def detection_dnn():
+    """Configuración del detector dnn (settings.DETECTION_DNN) o None"""
+    return getattr(settings, 'DETECTION_DNN', None)
+
+def request_detectors(request):
+    """Detectores pedidos con ?detectors=face,helmet (o en el formulario); None: los de uso por defecto.
+
+    Lanza ValueError si alguno no está registrado o si se pide dnn sin configurarlo.
+    """
+    names = parse_detector_names(request.GET.get('detectors') or request.POST.get('detectors'))
+    if 'dnn' in resolve_detectors(names) and not detection_dnn():
+        raise ValueError("El detector dnn no está configurado (settings.DETECTION_DNN)")
+    return names
+
+def build_detection_result(original_data, processed_data, detections):
+    """Guardar las imágenes y crear (sin guardar) el registro de detección"""
+    detection_result = DetectionResult()
     
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
+    # Guardar imagen original; un archivo subido se guarda sin leerlo entero
+    # (si Django lo dejó en un temporal, el almacenamiento lo mueve)
+    if not isinstance(original_data, File):
+        original_data = ContentFile(original_data)
+    detection_result.image = default_storage.save(
+        f'detections/original_{int(time.time())}.jpg',
+        original_data
+    )
     
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Guardar imagen procesada
+    detection_result.processed_image = default_storage.save(
+        f'processed/processed_{int(time.time())}.jpg',
+        ContentFile(processed_data)
+    )
     
-    phones = []
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if 500 < area < 5000:  # Área típica de un teléfono
-            x, y, w, h = cv2.boundingRect(contour)
-            aspect_ratio = w / h
-            # Verificar proporciones típicas de un teléfono (vertical u horizontal)
-            if (0.4 <= aspect_ratio <= 0.8) or (1.2 <= aspect_ratio <= 2.5):
-                phones.append((x, y, w, h))
+    # Guardar datos de detección
+    detection_result.objects_detected = json.dumps([label for label, _, _ in detections])
+    detection_result.confidence_scores = json.dumps([
+        confidence if confidence is not None else UPLOAD_CONFIDENCE
+        for _, _, confidence in detections
+    ])
+    detection_result.detection_count = len(detections)
+    return detection_result
+
+def detection_result_data(detection_result, detected_objects):
+    """Respuesta JSON de una imagen procesada"""
+    return {
+        'success': True,
+        'detection_count': detection_result.detection_count,
+        'objects': detected_objects,
+        'original_image_url': settings.MEDIA_URL + detection_result.image.name,
+        'processed_image_url': settings.MEDIA_URL + detection_result.processed_image.name,
+        'id': detection_result.id
+    }
+
+async def detect_objects(request):
+    """API endpoint con las últimas detecciones del video en tiempo real (?camera= id)"""
+    if request.method == 'GET':
+        try:
+            camera = get_camera(request.GET.get('camera', DEFAULT_CAMERA))
+            if camera is None:
+                return JsonResponse(detection_snapshot_data(None))
+            
+            since = request.GET.get('since')
+            if since is not None:
+                # Long-polling: responder cuando las detecciones cambien respecto de since;
+                # la espera no ocupa un hilo por cliente
+                timeout = min(float(request.GET.get('timeout', DETECT_POLL_TIMEOUT)), DETECT_POLL_TIMEOUT)
+                snapshot = await camera.wait_detections_async(int(since), max(timeout, 0))
+            else:
+                snapshot = camera.snapshot
+            
+            return JsonResponse(detection_snapshot_data(snapshot))
+            
+        except ValueError:
+            return JsonResponse({'error': 'since y timeout deben ser numéricos'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
     
-    return phones
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
 
-def detect_masks_static(frame, faces):
-    """Detectar mascarillas en la región facial inferior en imagen estática"""
-    if not OPENCV_AVAILABLE:
-        return []
+def detect_stream(request):
+    """Server-Sent Events con las detecciones del video, enviadas solo cuando cambian"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
     
-    masks = []
+    # Al reconectar, el navegador indica el último evento recibido
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID') or request.GET.get('since') or 0)
+    except ValueError:
+        last_seq = 0
     
-    for (fx, fy, fw, fh) in faces:
-        # Región inferior del rostro donde estaría la mascarilla
-        mask_y = fy + int(fh * 0.5)
-        mask_h = int(fh * 0.4)
+    camera_id = request.GET.get('camera', DEFAULT_CAMERA)
+    if isinstance(request, ASGIRequest):
+        # Bajo ASGI Django acumularía un generador normal antes de enviarlo
+        events = adetection_events(last_seq, camera_id)
+    else:
+        events = detection_events(last_seq, camera_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def detection_events(last_seq, camera_id=DEFAULT_CAMERA):
+    """Generador de eventos SSE; un comentario periódico mantiene viva la conexión"""
+    yield f'retry: {SSE_RETRY_MS}\n\n'
+    while True:
+        current = get_camera(camera_id)
+        if current is None:
+            # El video todavía no se inició
+            time.sleep(1.0)
+            yield ': esperando\n\n'
+            continue
         
-        if mask_y + mask_h < frame.shape[0]:
-            roi = frame[mask_y:mask_y+mask_h, fx:fx+fw]
-            
-            # Detectar colores típicos de mascarillas (azul, blanco, negro)
-            hsv_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-            
-            # Máscara para colores típicos de mascarillas
-            lower_blue = np.array([100, 50, 50])
-            upper_blue = np.array([130, 255, 255])
-            mask_blue = cv2.inRange(hsv_roi, lower_blue, upper_blue)
-            
-            lower_white = np.array([0, 0, 200])
-            upper_white = np.array([180, 30, 255])
-            mask_white = cv2.inRange(hsv_roi, lower_white, upper_white)
-            
-            combined_mask = cv2.bitwise_or(mask_blue, mask_white)
-            
-            # Si hay suficientes píxeles de color de mascarilla
-            if np.sum(combined_mask) > roi.shape[0] * roi.shape[1] * 0.3:
-                masks.append((fx, mask_y, fw, mask_h))
-    
-    return masks
\ No newline at end of file
+        snapshot = current.wait_detections(last_seq, DETECT_KEEPALIVE)
+        if not current.running:
+            return
+        if snapshot.seq == last_seq:
+            yield ': keep-alive\n\n'
+            continue
+        
+        last_seq = snapshot.seq
+        yield detection_event(snapshot)
+
+async def adetection_events(last_seq, camera_id=DEFAULT_CAMERA):
+    """Versión asíncrona de detection_events para ASGI: espera en el event loop, sin hilo por cliente"""
+    yield f'retry: {SSE_RETRY_MS}\n\n'
+    while True:
+        current = get_camera(camera_id)
+        if current is None:
+            await asyncio.sleep(1.0)
+            yield ': esperando\n\n'
+            continue
+        
+        snapshot = await current.wait_detections_async(last_seq, DETECT_KEEPALIVE)
+        if not current.running:
+            return
+        if snapshot.seq == last_seq:
+            yield ': keep-alive\n\n'
+            continue
+        
+        last_seq = snapshot.seq
+        yield detection_event(snapshot)
+
+def detection_event(snapshot):
+    data = json.dumps(detection_snapshot_data(snapshot))
+    return f'id: {snapshot.seq}\nevent: detections\ndata: {data}\n\n'
+
+def detection_snapshot_data(snapshot):
+    """JSON de un DetectionSnapshot de la cámara (None si el video no está activo)"""
+    if snapshot is None:
+        return {
+            'active': False,
+            'seq': 0,
+            'frame_seq': 0,
+            'timestamp': None,
+            'objects_detected': [],
+            'coordinates': [],
+            'confidence': [],
+        }
+    return {
+        'active': True,
+        'seq': snapshot.seq,
+        'frame_seq': snapshot.frame_seq,
+        'timestamp': snapshot.timestamp,
+        'objects_detected': [d.label for d in snapshot.detections],
+        'coordinates': [list(d.box) for d in snapshot.detections],
+        'confidence': [
+            d.confidence if d.confidence is not None else DEFAULT_CONFIDENCE
+            for d in snapshot.detections
+        ],
+    }
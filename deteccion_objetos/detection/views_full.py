@@ -30,6 +30,7 @@ import threading
 import time
 import os
 from .models import DetectionResult
+from .resources import face_cascade
 from PIL import Image
 import io
 import base64
@@ -266,17 +267,15 @@ def process_image_for_detection(image):
         'coordinates': []
     }
     
-    # Cargar el clasificador Haar Cascade para detección de rostros
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    
-    # Detectar rostros
+    # Detectar rostros con un clasificador del pool del proceso
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.1,
-        minNeighbors=5,
-        minSize=(30, 30)
-    )
+    with face_cascade() as cascade:
+        faces = cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(30, 30)
+        )
     
     # Procesar rostros detectados
     for (x, y, w, h) in faces:
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import struct
+import time
+from contextlib import aclosing
+from urllib.parse import parse_qsl
+from asgiref.sync import sync_to_async
+from .encoding import AdaptiveQuality, parse_stream_params
+from .registry import DEFAULT_CAMERA, CameraUnavailable, UnknownCamera
+from .resources import OPENCV_AVAILABLE
+from .views import detection_snapshot_data, encode_variant, get_broadcaster
+
+# Ruta del canal WebSocket de video (se enruta desde asgi.py): /ws/video/ o /ws/video/<camera_id>/
+VIDEO_WS_PATH = '/ws/video/'
+
+# Cada mensaje binario: longitud del encabezado (uint32 big-endian),
+# encabezado JSON con las detecciones y a continuación el JPEG
+HEADER_LENGTH = struct.Struct('>I')
+
+
+def encode_message(frame_seq, frame, snapshot, skipped=0, quality=None):
+    """Mensaje binario con el frame JPEG y sus detecciones"""
+    header = detection_snapshot_data(snapshot)
+    header['frame'] = frame_seq
+    header['skipped'] = skipped
+    header['quality'] = quality
+    header = json.dumps(header).encode('utf-8')
+    return HEADER_LENGTH.pack(len(header)) + header + frame
+
+
+async def video_socket(scope, receive, send):
+    """Aplicación ASGI del canal WebSocket de video.
+
+    El envío espera a que el cliente consuma cada mensaje; mientras tanto la
+    cola del difusor conserva solo el frame más nuevo, así un cliente lento
+    salta frames en lugar de acumularlos.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    # Mismos parámetros que /video_feed/: ?q= (calidad o auto) y ?w= (ancho)
+    try:
+        quality, width = parse_stream_params(dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'))))
+    except ValueError:
+        await send({'type': 'websocket.close', 'code': 1008})
+        return
+
+    if not OPENCV_AVAILABLE:
+        await send({'type': 'websocket.close', 'code': 1011})
+        return
+    camera_id = scope['path'][len(VIDEO_WS_PATH):].strip('/') or DEFAULT_CAMERA
+    try:
+        broadcaster = await sync_to_async(get_broadcaster)(camera_id)
+    except UnknownCamera:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    except CameraUnavailable:
+        # 1013: "Try Again Later"
+        await send({'type': 'websocket.close', 'code': 1013})
+        return
+    except Exception as e:
+        print(f"Error al acceder a la cámara: {e}")
+        await send({'type': 'websocket.close', 'code': 1011})
+        return
+
+    await send({'type': 'websocket.accept'})
+    sender = asyncio.create_task(_send_frames(broadcaster, send, quality, width))
+    try:
+        # Los mensajes del cliente se ignoran; solo interesa saber cuándo se va
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+async def _send_frames(broadcaster, send, quality=None, width=None):
+    loop = asyncio.get_running_loop()
+    adaptive = AdaptiveQuality() if quality is None else None
+    last_seq = None
+    async with aclosing(broadcaster.subscribe_async(with_snapshot=True)) as frames:
+        async for frame_seq, frame, snapshot in frames:
+            frame_quality = adaptive.quality if adaptive else quality
+            data = await encode_variant(loop, frame, frame_quality, width)
+            if data is None:
+                continue
+            skipped = frame_seq - last_seq - 1 if last_seq is not None else 0
+            last_seq = frame_seq
+            started = time.monotonic()
+            message = encode_message(frame_seq, data, snapshot, skipped, frame_quality)
+            await send({'type': 'websocket.send', 'bytes': message})
+            # send espera a que el cliente consuma el mensaje
+            if adaptive is not None:
+                adaptive.update(time.monotonic() - started)
@@ -0,0 +1,117 @@
+import multiprocessing
+from multiprocessing import shared_memory
+from .pipeline import TRACK_FULL_EVERY, Detection, DetectionPipeline
+from .resources import OPENCV_AVAILABLE, cv2, face_cascade, np
+
+# Segundos máximos de espera por el resultado de un frame
+RESULT_TIMEOUT = 5.0
+# Segundos para que el proceso termine al detenerlo
+STOP_TIMEOUT = 2.0
+
+
+def _worker_main(conn, track_every, names=None, budget=None, dnn=None):
+    """Bucle del proceso de detección: lee el frame de la memoria compartida y devuelve las cajas"""
+    if OPENCV_AVAILABLE:
+        cv2.setNumThreads(1)
+    shm = None
+    frame = None
+    with face_cascade() as cascade:
+        # El seguimiento de rostros guarda estado: un proceso por cámara
+        pipeline = DetectionPipeline(cascade, track_every=track_every, names=names, budget=budget, dnn=dnn)
+        conn.send('ready')
+        try:
+            while True:
+                message = conn.recv()
+                if message is None:
+                    break
+                if message[0] == 'attach':
+                    # Nuevo bloque de memoria (primer frame o cambio de tamaño)
+                    _, name, shape = message
+                    frame = None
+                    if shm is not None:
+                        shm.close()
+                    shm = shared_memory.SharedMemory(name=name)
+                    frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+                    continue
+                try:
+                    detections = pipeline.run(frame)
+                    boxes = [(d.label, tuple(int(v) for v in d.box), d.confidence) for d in detections]
+                    conn.send((boxes, pipeline.last_timings))
+                except Exception as e:
+                    conn.send(e)
+        except (EOFError, KeyboardInterrupt):
+            pass
+        finally:
+            frame = None
+            if shm is not None:
+                shm.close()
+
+
+class ProcessDetector:
+    """Ejecuta el pipeline de una cámara en un proceso propio.
+
+    Los frames pasan por memoria compartida (una copia, sin pickle) y solo las
+    cajas vuelven por el pipe, así varias cámaras detectan en paralelo en
+    distintos núcleos sin competir por el GIL.
+    """
+
+    def __init__(self, track_every=TRACK_FULL_EVERY, names=None, budget=None, dnn=None):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, track_every, names, budget, dnn),
+            name='detection-worker', daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.shm = None
+        self.frame = None
+        # Tiempos por etapa del último frame, medidos en el proceso hijo
+        self.last_timings = {}
+
+    def is_ready(self):
+        """True cuando el proceso ya cargó OpenCV y el clasificador"""
+        if not self.ready and self.conn.poll():
+            self.ready = self.conn.recv() == 'ready'
+        return self.ready
+
+    def _attach(self, shape):
+        self._free()
+        size = int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.frame = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.conn.send(('attach', self.shm.name, shape))
+
+    def _free(self):
+        self.frame = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def run(self, frame):
+        """Detecciones del frame calculadas en el proceso hijo"""
+        if self.frame is None or self.frame.shape != frame.shape:
+            self._attach(frame.shape)
+        np.copyto(self.frame, frame)
+        self.conn.send(('run',))
+        if not self.conn.poll(RESULT_TIMEOUT):
+            raise TimeoutError("El proceso de detección no respondió")
+        result = self.conn.recv()
+        if isinstance(result, Exception):
+            raise result
+        boxes, self.last_timings = result
+        return [Detection(label, box, confidence) for label, box, confidence in boxes]
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(STOP_TIMEOUT)
+        self.conn.close()
+        self._free()
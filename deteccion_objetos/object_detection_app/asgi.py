@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'object_detection_app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importar después de configurar Django
+from detection.websocket import VIDEO_WS_PATH, video_socket
+
+
+async def application(scope, receive, send):
+    """HTTP lo atiende Django; el canal WebSocket de video, detection.websocket"""
+    if scope['type'] == 'websocket':
+        if scope['path'].startswith(VIDEO_WS_PATH):
+            return await video_socket(scope, receive, send)
+        # Ruta WebSocket desconocida: rechazar el handshake
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 1000})
+    return await django_application(scope, receive, send)
@@ -4,6 +4,7 @@ $(document).ready(function() {
     // Video controls
     let videoActive = false;
     let detectionInterval;
+    let detectionSource = null;
     
     // Initialize video controls
     $('#start-video').click(function() {
@@ -37,7 +38,7 @@ $(document).ready(function() {
         $('#video-stream').attr('src', '/video_feed/');
         
         // Start detection updates
-        detectionInterval = setInterval(updateDetectionResults, 2000);
+        startDetectionUpdates();
         
         showToast('Video iniciado', 'success');
     }
@@ -49,7 +50,7 @@ $(document).ready(function() {
         $('#stop-video').prop('disabled', true);
         
         // Stop detection updates
-        clearInterval(detectionInterval);
+        stopDetectionUpdates();
         
         // Reset video source
         $('#video-stream').attr('src', '');
@@ -165,6 +166,31 @@ $(document).ready(function() {
         }, 500);
     }
     
+    // Receive detections from the server only when they change (Server-Sent Events)
+    function startDetectionUpdates() {
+        stopDetectionUpdates();
+        
+        if (!window.EventSource) {
+            // Fallback for browsers without EventSource
+            detectionInterval = setInterval(updateDetectionResults, 2000);
+            return;
+        }
+        
+        detectionSource = new EventSource('/detect/stream/');
+        detectionSource.addEventListener('detections', function(e) {
+            const data = JSON.parse(e.data);
+            updateCounters(data.objects_detected);
+        });
+    }
+    
+    function stopDetectionUpdates() {
+        clearInterval(detectionInterval);
+        if (detectionSource) {
+            detectionSource.close();
+            detectionSource = null;
+        }
+    }
+    
     // Update detection results from video
     function updateDetectionResults() {
         if (!videoActive) return;
@@ -278,13 +304,6 @@ $(document).ready(function() {
         }
     });
     
-    // Auto-refresh detection stats every 5 seconds
-    setInterval(function() {
-        if (videoActive) {
-            updateDetectionResults();
-        }
-    }, 5000);
-    
     // Initialize tooltips
     const tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
     tooltipTriggerList.map(function(tooltipTriggerEl) {